@@ -33,6 +33,15 @@ views.  Set ``GECKOBOARD_API_KEY`` in the project ``settings.py`` file::
 If you do not set an API key, anyone will be able to view the data by
 visiting the widget URL.
 
+To change the API key without rejecting requests that still use the old
+one, set a list of keys.  Any of them is accepted::
+
+    GECKOBOARD_API_KEY = ['NEW_KEY', 'OLD_KEY']
+
+The settings are read once and cached.  If you change them at runtime,
+use ``django.test.override_settings`` or send the ``setting_changed``
+signal, so that the cached values are refreshed.
+
 
 Encryption
 ==========
@@ -51,6 +60,219 @@ Next, enable encryption for each widget using the decorator arguments::
         def user_count(request):
             return User.objects.count()
 
+Each encrypted response uses a new random salt, from which the
+encryption key is derived.  To save the cost of key derivation, you can
+reuse the salt and key for a number of seconds by setting
+``GECKOBOARD_SALT_ROTATION``::
+
+    GECKOBOARD_SALT_ROTATION = 10
+
+This weakens the encryption.  The initialization vector is derived from
+the salt as well, so until the salt changes, responses that start with
+the same bytes start with the same ciphertext, and responses with the
+same data are identical.  Key derivation only takes a few microseconds
+per response, so use a short rotation interval, and leave the setting
+unset unless you have measured that the saving matters.
+
+
+JSON backend
+============
+
+JSON output is encoded with the standard library ``json`` module by
+default.  If orjson_ or ujson_ is installed, you can select it with the
+``GECKOBOARD_JSON_BACKEND`` setting, which is one of ``'json'``,
+``'orjson'``, ``'ujson'`` or ``'auto'`` (the fastest installed
+backend)::
+
+    GECKOBOARD_JSON_BACKEND = 'auto'
+
+If the selected backend is not installed, the ``json`` module is used.
+
+.. _orjson: https://pypi.org/project/orjson/
+.. _ujson: https://pypi.org/project/ujson/
+
+
+Caching
+=======
+
+Geckoboard polls every widget URL regularly, often from several
+dashboards at once.  To avoid running the view on every poll, pass a
+``cache_timeout`` (in seconds) to the decorator::
+
+    @number_widget(cache_timeout=60)
+    def user_count(request):
+        return User.objects.count()
+
+The rendered response is stored in the default Django cache.  Use the
+``cache_alias`` argument to select another cache from the ``CACHES``
+setting.  Separate entries are kept for each decorated view, set of URL
+arguments, output format and encryption setting.
+
+For slow widgets, you can have the decorator return the last cached
+response immediately while a fresh one is computed in the background.
+Pass a ``stale_timeout`` as well; ``cache_timeout`` then determines when
+a background refresh is started and ``stale_timeout`` the maximum age
+of a response that is still returned::
+
+    @funnel(cache_timeout=60, stale_timeout=600)
+    def signup_funnel(request):
+        ...
+
+Only one refresh per widget runs at a time.  Refreshes run on a thread
+pool, the size of which is set by ``GECKOBOARD_REFRESH_WORKERS`` (4 by
+default).  Note that the view is called with the request that triggered
+the refresh, after the response to that request has been returned.
+
+When many dashboards poll the same widget at the same moment, each
+request would run the view.  Set ``coalesce=True`` to let concurrent
+requests in a process wait for the first one and share its response.
+With ``coalesce='cache'`` (which requires ``cache_timeout``), processes
+also share the computation through a lock stored in the cache, so that
+only one worker runs the view::
+
+    @number_widget(cache_timeout=60, coalesce='cache')
+    def order_count(request):
+        return Order.objects.count()
+
+The lock expires after ``coalesce_timeout`` seconds (30 by default),
+which should be longer than the view takes to run.
+
+To protect the database from widgets that are polled by many
+dashboards, pass ``min_interval`` (in seconds).  The view is then called
+at most once per interval for each set of URL arguments, by all
+processes together, and requests in between get the last response::
+
+    @line_chart(min_interval=300)
+    def order_trend(request):
+        ...
+
+Unlike ``cache_timeout``, the interval is enforced with a gate in the
+cache, and the last response is kept without expiry and in a local
+cache of each process, so that the view is not called more often when a
+response is evicted.
+
+Widgets that serve many variants, such as one per team or region, can
+declare which URL keyword arguments and query string parameters
+identify a variant with ``vary_on``.  Other parameters, such as
+cache-busting timestamps, then share the cached response.  The
+``cache_timeout`` may be a function of the variant, and ``max_variants``
+caps the number of variants whose last response each process keeps in
+memory for ``min_interval``, evicting the least recently used ones.
+Entries in the shared cache expire through their own timeouts::
+
+    def team_timeout(variant):
+        return 600 if variant.get('team') == 'archive' else 60
+
+    @number_widget(vary_on=['team', 'region'], cache_timeout=team_timeout,
+                   min_interval=30, max_variants=500)
+    def team_orders(request, team):
+        return Order.objects.filter(team=team,
+                                    region=request.GET.get('region')).count()
+
+
+Conditional requests
+====================
+
+Most widgets change much less often than they are polled.  Pass
+``etag=True`` to the decorator to send an ``ETag`` header with each
+response::
+
+    @number_widget(etag=True, cache_timeout=60)
+    def user_count(request):
+        return User.objects.count()
+
+A GET request with a matching ``If-None-Match`` header then gets an
+empty *304 Not Modified* response.  When the response is cached, the
+ETag is cached with it.  Encrypted responses only match while the salt
+is unchanged (see ``GECKOBOARD_SALT_ROTATION``) or the response is
+cached.
+
+
+Compression
+===========
+
+Large widgets, such as line charts with many points, can be compressed
+by passing ``compress=True`` to the decorator::
+
+    @line_chart(compress=True, cache_timeout=60)
+    def order_trend(request):
+        ...
+
+Responses of at least ``compress_min_size`` bytes (200 by default) are
+compressed with gzip, or with brotli_ if it is installed and the client
+accepts it.  When the response is cached, each process keeps the
+compressed content in memory, so that it is compressed only once per
+encoding, when a client first asks for it.
+
+.. _brotli: https://pypi.org/project/Brotli/
+
+
+Timing
+======
+
+To find out where a slow widget spends its time, connect a receiver to
+the ``django_geckoboard.signals.widget_timing`` signal.  It is sent
+after every widget request, with the wall time in seconds of each phase
+of the request::
+
+    from django.dispatch import receiver
+    from django_geckoboard.signals import widget_timing
+
+    @receiver(widget_timing)
+    def report_timing(sender, view, timings, duration, **kwargs):
+        for phase, seconds in timings.items():
+            statsd.timing('geckoboard.%s.%s' % (view.__name__, phase), seconds)
+
+The phases are ``auth`` (the API key check), ``view``, ``convert``
+(conversion of the view result), ``serialize`` and ``encrypt``.  Phases
+that did not run, for example because the response was cached, are
+left out.  If no receiver is connected, nothing is measured.
+
+
+Dashboard view
+==============
+
+To fetch the output of many widgets in one request, for example for a
+status page, create a view using ``django_geckoboard.views.dashboard``::
+
+    from django_geckoboard.views import dashboard
+
+    status = dashboard([user_count, comment_count], timeout=5)
+
+The widget views are called concurrently on a thread pool, or as tasks
+if some of them are asynchronous (the dashboard view is then
+asynchronous too).  The response is a JSON object with a ``widgets``
+member that maps the view names to their JSON output, and an ``errors``
+member for views that failed or did not finish within *timeout*
+seconds, which applies to all views together.  Pass *(name, view)*
+tuples to choose other names.
+
+A view that times out keeps running on its worker thread.  It is not
+called again until that call finishes; later requests wait for the
+running call instead, so that a stuck view cannot use up the workers
+of the other views.
+
+
+Pushing data
+============
+
+Instead of letting Geckoboard poll your widgets, you can push data to
+Geckoboard.  The ``django_geckoboard.push.PushClient`` class renders the
+data using the same decorators as polled widgets::
+
+    from django_geckoboard.decorators import number_widget
+    from django_geckoboard.push import PushClient
+
+    client = PushClient()
+    client.push(number_widget, 'WIDGET_KEY', (User.objects.count(),))
+
+The API key defaults to the ``GECKOBOARD_API_KEY`` setting.  To push
+many widgets at once, use ``push_many`` with a list of *(decorator,
+widget_key, result)* tuples.  It returns the response or the
+``PushError`` for each push.  Connections are kept open and reused, at
+most ``max_connections`` (4 by default) requests are sent concurrently,
+and failed requests are retried with exponential backoff.
+
 
 Creating custom widgets
 =======================
@@ -83,7 +305,7 @@ You can also specify the output format of the widget as either JSON or XML::
 
 
 If your widget has optional settings, you can pass them in the decorator
-definition::
+definition.  They are serialized only once, when the view is decorated::
 
     @number_widget(absolute='true')
     def comment_count(request):
@@ -91,6 +313,18 @@ definition::
         return Comment.objects.filter(submit_date__gte=midnight).count()
 
 
+Asynchronous views can be decorated as well.  The decorated view is
+then asynchronous too, so that it runs without thread handoffs under
+ASGI::
+
+    @number_widget
+    async def order_count(request):
+        return await Order.objects.acount()
+
+The caching arguments use the asynchronous cache API of Django 4.0 and
+later.  On older versions, cache calls of asynchronous views run in a
+thread, so that they do not block the event loop.
+
 Then use a URLconf module to map a URL to the view::
 
     from django.conf.urls.defaults import *
@@ -122,7 +356,10 @@ Feed format
     Either *XML* or *JSON*.  If you don't specify a format the decorators will
     automatically detect and output the correct format or default to XML
     if this is not enabled (by default the format isn't appended by
-    Geckoboard as a parameter any more)
+    Geckoboard as a parameter any more).  The format is taken from the
+    ``format`` query string parameter, then from the ``format`` form
+    parameter of POST requests, then from the ``Accept`` header (the
+    response then has a ``Vary: Accept`` header).
 
 Request type
     Either *GET* or *POST*.  The view decorators accept both.
@@ -142,6 +379,7 @@ The decorated view must return a tuple *(current, [previous],
 *previous* parameter is the previous value of the measured quantity and
 the optional parameter *prefix* is the prefix used in Geckoboard widget.
 If there is only one parameter you do not need to return it in a tuple.
+NumPy arrays and scalars can be returned as well.
 For example, to render a widget that shows the number of users and the
 difference from last week::
 
@@ -163,6 +401,54 @@ difference from last week::
         last_week_users = users.filter(date_joined__lt=last_week)
         return (users.count(), last_week_users.count(), '$')
 
+Views like these run a query for each value.  The
+``django_geckoboard.aggregates.current_previous`` function computes
+both values in a single query, using conditional aggregates::
+
+    from django_geckoboard.aggregates import current_previous
+
+    @number_widget
+    def user_count(request):
+        return current_previous(User.objects.all(), 'date_joined',
+                                timedelta(weeks=1), cumulative=True)
+
+    @number_widget
+    def revenue_this_week(request):
+        return current_previous(Order.objects.all(), 'created',
+                                timedelta(weeks=1), aggregate='sum',
+                                field='amount')
+
+By default, the current value aggregates the rows in the last *period*
+and the previous value the rows in the period before that.  With
+``cumulative=True``, the current value aggregates all rows and the
+previous value the rows from before the last period.  The *aggregate*
+is ``'count'`` (the default), ``'sum'`` or ``'avg'``.
+
+For counts that are polled often, such as orders today, you can keep
+the count in the cache instead of querying the database on every poll.
+A ``django_geckoboard.counters.Counter`` is updated by the
+``post_save`` and ``post_delete`` signals of a model, per day or hour
+of a date field::
+
+    from django_geckoboard.counters import Counter
+
+    paid_orders = Counter('paid_orders', Order, filter={'status': 'paid'},
+                          date_field='created')
+
+    @number_widget
+    def orders_today(request):
+        return paid_orders.current_previous()
+
+Define counters in a module that is always imported, such as
+``models.py``.  The cache should support atomic increments, like
+memcached or Redis.  Updates that change whether an instance is
+counted are only seen with ``track_updates=True``, and bulk operations
+are never seen.  To recompute the counters from the database, add
+``django_geckoboard`` to ``INSTALLED_APPS`` and run the
+``geckoboard_counters`` management command, for example daily::
+
+    python manage.py geckoboard_counters --buckets 7
+
 
 ``rag_widget``
 --------------
@@ -197,6 +483,34 @@ were approved or deleted by moderators in the last 24 hours::
             (approved_count, "Approved comments"),
         )
 
+This view runs four queries.  The ``rag_counts`` function from
+``django_geckoboard.aggregates`` counts the objects matching three ``Q``
+conditions in a single query (here on the moderation fields of the
+comments, instead of their flags), and ``rag_thresholds`` does the same for
+value thresholds on a field::
+
+    from django.db.models import Q
+    from django_geckoboard.aggregates import rag_counts, rag_thresholds
+
+    @rag_widget
+    def comments(request):
+        start_time = datetime.now() - timedelta(hours=24)
+        return rag_counts(
+            Comment.objects.filter(submit_date__gt=start_time),
+            Q(is_removed=True),
+            Q(is_removed=False, is_public=False),
+            Q(is_removed=False, is_public=True),
+            labels=("Deleted comments", "Pending comments",
+                    "Approved comments"))
+
+    @rag_widget
+    def response_times(request):
+        # Red above 2 seconds, amber above 0.5 seconds, green otherwise.
+        return rag_thresholds(Request.objects.all(), 'duration', 2.0, 0.5)
+
+For ``rag_thresholds``, higher values are better if the green threshold
+is at least the amber threshold, and lower values otherwise.
+
 
 ``text_widget``
 ---------------
@@ -233,7 +547,8 @@ Render a *Pie chart* widget.
 
 The decorated view must return an iterable over tuples *(value, label,
 [color])*.  The optional *color* parameter is a string ``'RRGGBB[TT]'``
-representing red, green, blue and optionally transparency.
+representing red, green, blue and optionally transparency.  A NumPy
+structured array with these fields can be returned as well.
 
 For example, to render a widget showing the number of normal, staff and
 superusers::
@@ -291,6 +606,49 @@ over the last four weeks (including today)::
             "Comments",
         )
 
+The values (and axis labels) can also be a NumPy array, an
+``array.array`` or a ``memoryview``.  These are converted to Python
+values in one step, without iterating over them in Python.
+
+A line chart widget is only a few hundred pixels wide.  For long series,
+pass ``max_points`` to reduce the values to at most that many points
+before they are rendered::
+
+    @line_chart(max_points=500)
+    def response_times(request):
+        ...
+
+By default the Largest-Triangle-Three-Buckets algorithm is used, which
+keeps the shape of the series including its peaks.  Pass
+``downsample='minmax'`` to keep the lowest and highest value of each
+interval instead.
+
+Instead of aggregating the full history of a trend on every poll, you
+can fold new data into a ``django_geckoboard.timeseries.TimeSeries``.
+It keeps the sums per minute, hour and day in the cache, and returns
+the *(values, x_axis, y_axis)* tuple for the widget, axis labels
+included::
+
+    from django_geckoboard.timeseries import TimeSeries
+
+    orders = TimeSeries('orders')
+
+    def place_order(order):
+        ...
+        orders.add(1)
+
+    @line_chart
+    def order_trend(request):
+        return orders.line_chart('day', buckets=30)
+
+Buckets expire after a number of periods of their resolution, by
+default 120 minutes, 72 hours and 90 days (see the ``retention``
+argument), so that older data is only kept at a coarser resolution.
+Use ``rebuild`` to fill the buckets from a queryset, for example when
+the series is first deployed::
+
+    orders.rebuild(Order.objects.all(), 'created', resolution='day')
+
 
 ``geck_o_meter``
 ----------------
@@ -352,6 +710,10 @@ vs. anonymous users::
                                   # descending.
         }
 
+The *type* and *percentage* entries can also be passed as decorator
+arguments, for example ``@funnel(type='reverse')``.  Values returned by
+the view take precedence.
+
 ``bullet``
 ----------
 
@@ -0,0 +1,125 @@
+"""
+Query helpers for Geckoboard widget views.
+
+The helpers compute all values a widget needs in a single query, using
+conditional aggregates, instead of running a query per value.
+"""
+from __future__ import absolute_import
+
+from django.db.models import Avg, Case, Count, F, Q, Sum, When
+from django.utils import timezone
+
+from django_geckoboard.decorators import GeckoboardException
+
+try:
+    from django.db.models.functions import Trunc
+except ImportError:
+    # Django < 1.10
+    Trunc = None
+
+
+AGGREGATES = {
+    'count': Count,
+    'sum': Sum,
+    'avg': Avg,
+}
+
+
+def current_previous(queryset, date_field, period, aggregate='count', field='pk',
+                     cumulative=False, now=None):
+    """
+    Return a `(current, previous)` tuple for ``number_widget``, computed
+    in a single query.
+
+    The `aggregate` is one of ``AGGREGATES`` (``'count'``, ``'sum'`` or
+    ``'avg'``) applied to `field` of the rows in `queryset`.  The
+    `period` is a ``timedelta``.  By default, `current` aggregates the
+    rows with `date_field` in the period before `now` (the current time
+    by default) and `previous` the rows in the period before that.  If
+    `cumulative` is True, `current` aggregates all rows and `previous`
+    the rows with `date_field` before the start of the period.
+
+    Sums and averages are None if there are no rows to aggregate.
+    """
+    try:
+        function = AGGREGATES[aggregate]
+    except KeyError:
+        raise GeckoboardException("unknown aggregate: %s" % aggregate)
+    if now is None:
+        now = timezone.now()
+    start = now - period
+    before_start = Q(**{date_field + '__lt': start})
+    if cumulative:
+        current = function(field)
+    else:
+        queryset = queryset.filter(**{date_field + '__gte': start - period,
+                                      date_field + '__lt': now})
+        current = function(Case(When(Q(**{date_field + '__gte': start}), then=F(field))))
+    previous = function(Case(When(before_start, then=F(field))))
+    result = queryset.aggregate(current=current, previous=previous)
+    return result['current'], result['previous']
+
+
+def rag_counts(queryset, red, amber, green, labels=None):
+    """
+    Return the red, amber and green values for ``rag_widget``, computed
+    in a single query.
+
+    The `red`, `amber` and `green` arguments are ``Q`` objects; each
+    value is the number of distinct objects in `queryset` that match the
+    condition.  A condition on a multi-valued relation matches an object
+    if any related row matches; note that negated conditions are also
+    evaluated per related row.  If `labels` is a sequence of three
+    strings, `(value, label)` tuples are returned.
+    """
+    result = queryset.aggregate(**dict(
+        (colour, Count(Case(When(condition, then=F('pk'))), distinct=True))
+        for colour, condition in (('red', red), ('amber', amber), ('green', green))))
+    values = (result['red'], result['amber'], result['green'])
+    if labels is None:
+        return values
+    return tuple(zip(values, labels))
+
+
+def rag_thresholds(queryset, field, amber, green, labels=None):
+    """
+    Return the red, amber and green values for ``rag_widget`` by
+    counting the rows in `queryset` by the value of `field`, in a single
+    query.
+
+    If `green` is at least `amber`, higher values are better: rows with
+    values below `amber` are red, values below `green` amber and others
+    green.  Otherwise lower values are better: rows with values above
+    `amber` are red, values above `green` amber and others green.  Rows
+    with a null value are not counted.  See `rag_counts` for `labels`.
+    """
+    if green >= amber:
+        red_q = Q(**{field + '__lt': amber})
+        amber_q = Q(**{field + '__gte': amber, field + '__lt': green})
+        green_q = Q(**{field + '__gte': green})
+    else:
+        red_q = Q(**{field + '__gt': amber})
+        amber_q = Q(**{field + '__lte': amber, field + '__gt': green})
+        green_q = Q(**{field + '__lte': green})
+    return rag_counts(queryset, red_q, amber_q, green_q, labels)
+
+
+def _period_values(queryset, date_field, period, field=None):
+    """
+    Return `(when, value)` pairs with the number of rows in `queryset`,
+    or the sum of `field`, per `period` (``'minute'``, ``'hour'`` or
+    ``'day'``) of `date_field`, computed in a single query.
+
+    Django versions before 1.10 cannot truncate dates in a query, so a
+    pair is returned for each row instead.  Callers add up the values of
+    the pairs that fall into the same period.
+    """
+    if Trunc is None:
+        if field is None:
+            return ((when, 1) for when in
+                    queryset.values_list(date_field, flat=True).iterator())
+        return queryset.values_list(date_field, field).iterator()
+    aggregate = Count('pk') if field is None else Sum(field)
+    rows = queryset.annotate(geckoboard_period=Trunc(date_field, period)) \
+        .values('geckoboard_period').annotate(value=aggregate).order_by()
+    return ((row['geckoboard_period'], row['value']) for row in rows)
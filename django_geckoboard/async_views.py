@@ -0,0 +1,275 @@
+"""
+Support for asynchronous views in the Geckoboard decorators.
+
+This module requires Python 3.5 or later.  It is imported by the
+decorators only when an asynchronous view is decorated.
+
+The cache is never accessed synchronously from the event loop.  The
+asynchronous cache methods of Django 4.0 and later are used if they
+exist, otherwise the synchronous methods are called in a thread.
+"""
+from __future__ import absolute_import
+
+from functools import partial
+import asyncio
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponseForbidden
+
+from django_geckoboard.caching import logger
+from django_geckoboard.decorators import (
+    _cache_key, _get_format, _is_api_key_correct, _make_response, _phase_timer,
+    iscoroutinefunction,
+)
+from django_geckoboard.views import (
+    _render_dashboard, _widget_request,
+)
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:
+    sync_to_async = None
+
+
+def wrap_async_view(decorator, view_func, view_id):
+    """
+    Return an asynchronous wrapper for an asynchronous view, identified
+    by `view_id` in cache keys.
+
+    The view result is converted and rendered in the event loop, without
+    handing off to a thread.  The wrapper supports the same caching
+    arguments as synchronous views.  Background refreshes run as tasks
+    in the event loop.
+    """
+    async def _wrapped_view(request, *args, **kwargs):
+        timer = _phase_timer()
+        if not _is_api_key_correct(request):
+            timer.stop('auth')
+            timer.send(decorator, view_func, request)
+            return HttpResponseForbidden("Geckoboard API key incorrect")
+        timer.stop('auth')
+        format, negotiated = decorator._format, False
+        if format is None:
+            format, negotiated = _get_format(request)
+        render = partial(_render_view, decorator, view_func, request, args, kwargs, format,
+                         timer)
+        if decorator._cache_timeout is None and not decorator._coalesce \
+                and decorator._min_interval is None:
+            payload = await render()
+        else:
+            variant = decorator._get_variant(request, kwargs)
+            key = _cache_key(view_id, args, variant, format, decorator._encrypted)
+            if decorator._min_interval is not None:
+                render = partial(_render_at_interval, decorator, key, render)
+            if decorator._cache_timeout is not None:
+                payload = await _get_cached_payload(decorator, key, render,
+                                                    decorator._get_timeout(variant))
+            elif decorator._coalesce:
+                payload = await flights.do(key, render)
+            else:
+                payload = await render()
+        response = _make_response(request, payload, decorator._compress_min_size,
+                                  negotiated)
+        timer.send(decorator, view_func, request)
+        return response
+    return _wrapped_view
+
+
+def async_dashboard(views, timeout, runner):
+    """
+    Return an asynchronous dashboard view, which calls synchronous views
+    with `runner`.  See `django_geckoboard.views.dashboard`.
+    """
+    async def dashboard_view(request):
+        if not _is_api_key_correct(request):
+            return HttpResponseForbidden("Geckoboard API key incorrect")
+        widget_request = _widget_request(request)
+        results = await asyncio.gather(
+            *[_call_dashboard_view(view, widget_request, timeout, runner)
+              for name, view in views],
+            return_exceptions=True)
+        return _render_dashboard([(name, view, result)
+                                  for (name, view), result in zip(views, results)])
+    dashboard_view.csrf_exempt = True
+    return dashboard_view
+
+
+async def _call_dashboard_view(view, request, timeout, runner):
+    if iscoroutinefunction(view):
+        call = view(request)
+    else:
+        # Shield the call, which may be shared with other requests.
+        call = asyncio.shield(asyncio.wrap_future(runner.submit(view, request)))
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError("timed out")
+
+
+async def _render_view(decorator, view_func, request, args, kwargs, format, timer):
+    timer.start()
+    view_result = await view_func(request, *args, **kwargs)
+    timer.stop('view')
+    return decorator._make_payload(view_result, format, timer)
+
+
+async def _render_at_interval(decorator, key, render):
+    cache = caches[decorator._cache_alias]
+    if not await _cache_call(cache, 'add', key + ':gate', True, decorator._min_interval):
+        payload = await _cache_call(cache, 'get', key + ':last')
+        if payload is None:
+            payload = decorator._last_payloads.get(key)
+        if payload is not None:
+            return payload
+    payload = await render()
+    await _cache_call(cache, 'set', key + ':last', payload, None)
+    decorator._last_payloads.set(key, payload)
+    return payload
+
+
+async def _get_cached_payload(decorator, key, render, timeout):
+    cache = caches[decorator._cache_alias]
+    payload = await _cache_call(cache, 'get', key)
+    if payload is None:
+        refresh = partial(_refresh_payload, decorator, key, render, timeout)
+        if decorator._coalesce == 'cache':
+            refresh = partial(coalesce_via_cache, cache, key, refresh,
+                              decorator._coalesce_timeout)
+        if decorator._coalesce:
+            return await flights.do(key, refresh)
+        return await refresh()
+    if decorator._is_stale(payload):
+        refresher.submit(key, partial(_background_refresh, decorator, key, render, timeout))
+    return payload
+
+
+async def _background_refresh(decorator, key, render, timeout):
+    if decorator._coalesce != 'cache':
+        await _refresh_payload(decorator, key, render, timeout)
+        return
+    lock = AsyncCacheLock(caches[decorator._cache_alias], key + ':lock',
+                          decorator._coalesce_timeout)
+    if await lock.acquire():
+        try:
+            await _refresh_payload(decorator, key, render, timeout)
+        finally:
+            await lock.release()
+
+
+async def _refresh_payload(decorator, key, render, timeout):
+    payload = await render()
+    await _cache_call(caches[decorator._cache_alias], 'set', key, payload,
+                      decorator._storage_timeout(payload, timeout))
+    return payload
+
+
+async def _cache_call(cache, method, *args):
+    """
+    Call a cache method without blocking the event loop.
+    """
+    async_method = getattr(cache, 'a' + method, None)
+    if async_method is not None:
+        return await async_method(*args)
+    func = partial(getattr(cache, method), *args)
+    if sync_to_async is not None:
+        return await sync_to_async(func)()
+    return await asyncio.get_event_loop().run_in_executor(None, func)
+
+
+class AsyncCacheLock(object):
+    """
+    Asynchronous version of `django_geckoboard.caching.CacheLock`.
+    """
+
+    def __init__(self, cache, key, timeout):
+        self.cache = cache
+        self.key = key
+        self.timeout = timeout
+
+    async def acquire(self):
+        """Try to acquire the lock without waiting.  Return whether it was acquired."""
+        return await _cache_call(self.cache, 'add', self.key, 1, self.timeout)
+
+    async def release(self):
+        await _cache_call(self.cache, 'delete', self.key)
+
+    async def locked(self):
+        return await _cache_call(self.cache, 'get', self.key) is not None
+
+
+class AsyncSingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key within an event loop.
+
+    The first caller for a key runs the coroutine function, later
+    callers await the same task.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, func):
+        key = (asyncio.get_event_loop(), key)
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda task: self._tasks.pop(key, None))
+        # Shield the task, so that a cancelled caller does not cancel
+        # the computation for the others.
+        return await asyncio.shield(task)
+
+
+flights = AsyncSingleFlight()
+
+
+class AsyncBackgroundRefresher(object):
+    """
+    Runs cache refresh coroutines as event loop tasks, at most one for
+    each key.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    def submit(self, key, func):
+        """
+        Schedule `func()` unless a refresh for `key` is already pending.
+        Return whether the refresh was scheduled.
+        """
+        if key in self._tasks:
+            return False
+        task = self._tasks[key] = asyncio.ensure_future(func())
+        task.add_done_callback(partial(self._done, key))
+        return True
+
+    def _done(self, key, task):
+        del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background refresh of %s failed", key,
+                         exc_info=task.exception())
+
+
+refresher = AsyncBackgroundRefresher()
+
+
+async def coalesce_via_cache(cache, key, func, timeout, poll_interval=0.05):
+    """
+    Asynchronous version of `django_geckoboard.caching.coalesce_via_cache`.
+    """
+    lock = AsyncCacheLock(cache, key + ':lock', timeout)
+    if await lock.acquire():
+        try:
+            return await func()
+        finally:
+            await lock.release()
+    deadline = time.time() + timeout
+    while await lock.locked() and time.time() < deadline:
+        await asyncio.sleep(poll_interval)
+        value = await _cache_call(cache, 'get', key)
+        if value is not None:
+            return value
+    value = await _cache_call(cache, 'get', key)
+    if value is not None:
+        return value
+    return await func()
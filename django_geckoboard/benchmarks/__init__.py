@@ -0,0 +1,11 @@
+"""
+Benchmarks for django-geckoboard.
+
+Run all benchmarks, or only the named ones, with::
+
+    $ python -m django_geckoboard.benchmarks [NAME ...]
+
+Each benchmark module has a ``run`` function that returns a list of
+result dictionaries.  The results are written to standard output as a
+JSON list, so that runs can be saved and compared over time.
+"""
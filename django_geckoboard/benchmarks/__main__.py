@@ -0,0 +1,59 @@
+"""
+Run the django-geckoboard benchmarks and print the results as JSON.
+"""
+from __future__ import absolute_import
+
+from importlib import import_module
+import argparse
+import json
+import platform
+import sys
+import time
+
+import django
+
+from django_geckoboard.benchmarks.utils import setup_django
+import django_geckoboard
+
+
+BENCHMARKS = [
+    'api_key',
+    'concurrency',
+    'encryption',
+    'json_backends',
+    'widgets',
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m django_geckoboard.benchmarks',
+                                     description="Run django-geckoboard benchmarks.")
+    parser.add_argument('names', nargs='*', metavar='NAME', choices=BENCHMARKS + [[]],
+                        help="benchmarks to run (default: all)")
+    parser.add_argument('-o', '--output', help="write the results to a file")
+    args = parser.parse_args(argv)
+    setup_django()
+    results = []
+    for name in args.names or BENCHMARKS:
+        module = import_module('django_geckoboard.benchmarks.%s' % name)
+        results.extend(module.run())
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'django': django.get_version(),
+            'django_geckoboard': django_geckoboard.__version__,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
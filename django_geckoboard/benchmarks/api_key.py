@@ -0,0 +1,43 @@
+"""
+API key checks, compared with reading the setting and decoding the
+header on every request.
+"""
+from __future__ import absolute_import
+
+import base64
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.test.utils import override_settings
+
+from django_geckoboard.benchmarks.utils import measure
+from django_geckoboard.decorators import _is_api_key_correct
+
+
+def _uncached_is_api_key_correct(request):
+    # The check as it was before the settings and headers were cached.
+    api_key = getattr(settings, 'GECKOBOARD_API_KEY', None)
+    if api_key is None:
+        return True
+    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(auth) == 2:
+        if auth[0].lower() == b'basic':
+            request_key = base64.b64decode(auth[1]).split(b':')[0]
+            return request_key == api_key
+    return False
+
+
+def run():
+    results = []
+    request = HttpRequest()
+    request.META['HTTP_AUTHORIZATION'] = b'basic ' + base64.b64encode(b'abc:X')
+    for keys, api_key in (('one', b'abc'), ('rotation', [b'def', b'abc'])):
+        with override_settings(GECKOBOARD_API_KEY=api_key):
+            assert _is_api_key_correct(request)
+            if keys == 'one':
+                assert _uncached_is_api_key_correct(request)
+                results.append(measure('api_key', lambda: _uncached_is_api_key_correct(request),
+                                       keys=keys, mode='uncached'))
+            results.append(measure('api_key', lambda: _is_api_key_correct(request),
+                                   keys=keys, mode='cached'))
+    return results
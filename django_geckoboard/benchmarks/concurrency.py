@@ -0,0 +1,51 @@
+"""
+Widget request throughput under concurrency.
+
+Several threads call the same decorated view, each with its own request
+data, as a threaded WSGI server would.
+"""
+from __future__ import absolute_import
+
+import threading
+import time
+
+from django.http import HttpRequest
+
+from django_geckoboard.decorators import number_widget
+
+
+REQUESTS_PER_THREAD = 2000
+
+
+def _view(request):
+    return (int(request.GET['value']), 0)
+
+
+def _throughput(threads):
+    view = number_widget(format='json', absolute='true')(_view)
+
+    def worker(n):
+        request = HttpRequest()
+        request.GET['value'] = str(n)
+        for i in range(REQUESTS_PER_THREAD):
+            view(request)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.time() - start
+    requests = threads * REQUESTS_PER_THREAD
+    return {
+        'name': 'concurrency',
+        'params': {'threads': threads},
+        'calls': requests,
+        'seconds_per_call': elapsed / requests,
+        'calls_per_second': requests / elapsed,
+    }
+
+
+def run():
+    return [_throughput(threads) for threads in (1, 2, 4, 8)]
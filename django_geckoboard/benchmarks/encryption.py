@@ -0,0 +1,33 @@
+"""
+Encrypted against plain JSON rendering.
+"""
+from __future__ import absolute_import
+
+from django.test.utils import override_settings
+
+from django_geckoboard.benchmarks.utils import measure
+from django_geckoboard.decorators import (
+    _derived_keys, _render_json, line_chart, number_widget,
+)
+
+
+def _payloads():
+    number = number_widget()._convert_view_result((1234, 1200))
+    line = line_chart()._convert_view_result(
+        (list(range(1000)), ['first', 'last'], ['low', 'high']))
+    return [('number_widget', number), ('line_chart', line)]
+
+
+def run():
+    results = []
+    for widget, data in _payloads():
+        results.append(measure('encryption', lambda: _render_json(data),
+                               widget=widget, mode='plain'))
+        with override_settings(GECKOBOARD_SALT_ROTATION=None):
+            results.append(measure('encryption', lambda: _render_json(data, True),
+                                   widget=widget, mode='encrypted'))
+        with override_settings(GECKOBOARD_SALT_ROTATION=300):
+            _derived_keys.clear()
+            results.append(measure('encryption', lambda: _render_json(data, True),
+                                   widget=widget, mode='encrypted_salt_rotation'))
+    return results
@@ -0,0 +1,29 @@
+"""
+JSON rendering with each installed JSON backend.
+"""
+from __future__ import absolute_import
+
+from django_geckoboard.benchmarks.utils import measure
+from django_geckoboard.decorators import (
+    JSON_BACKENDS, _load_json_encoder, line_chart, text_widget,
+)
+
+
+def _payloads():
+    line = line_chart()._convert_view_result(
+        (list(range(10000)), ['first', 'last'], ['low', 'high']))
+    text = text_widget()._convert_view_result(
+        [(u'Message number %d \u2013 "quoted"' % i, 2) for i in range(1000)])
+    return [('line_chart', line), ('text_widget', text)]
+
+
+def run():
+    results = []
+    for backend in JSON_BACKENDS:
+        encoder = _load_json_encoder(backend)
+        if encoder is None:
+            continue
+        for widget, data in _payloads():
+            results.append(measure('json_backend', lambda: encoder(data),
+                                   backend=backend, widget=widget))
+    return results
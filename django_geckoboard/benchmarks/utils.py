@@ -0,0 +1,42 @@
+"""
+Benchmark utilities.
+"""
+from __future__ import absolute_import
+
+import os
+import timeit
+
+
+def setup_django():
+    """
+    Configure Django using the test settings, unless a settings module
+    has already been set.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_geckoboard.tests.settings')
+    import django
+    django.setup()
+
+
+def measure(name, func, min_time=0.2, repeat=3, **params):
+    """
+    Time calls of `func` and return a result dictionary.
+
+    The number of calls per run is increased until a run takes at least
+    `min_time` seconds.  The best of `repeat` runs is reported.  Extra
+    keyword arguments are included in the result as parameters.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+    best = min([elapsed] + timer.repeat(repeat - 1, number))
+    return {
+        'name': name,
+        'params': params,
+        'calls': number,
+        'seconds_per_call': best / number,
+        'calls_per_second': number / best,
+    }
@@ -0,0 +1,67 @@
+"""
+Per-request overhead of each widget decorator.
+
+Every decorator is measured with XML, JSON and encrypted JSON output.
+Decorators that take a list of items are measured with several payload
+sizes.  The views return precomputed data, so the results show the time
+spent in the decorators only.
+"""
+from __future__ import absolute_import
+
+from django.http import HttpRequest
+
+from django_geckoboard.benchmarks.utils import measure
+from django_geckoboard.decorators import (
+    TEXT_INFO, bullet, funnel, geck_o_meter, line_chart, number_widget,
+    pie_chart, rag_widget, text_widget,
+)
+
+
+SIZES = [('small', 10), ('medium', 100), ('large', 1000), ('huge', 10000)]
+
+OUTPUTS = [
+    ('xml', {'format': 'xml'}),
+    ('json', {'format': 'json'}),
+    ('json_encrypted', {'format': 'json', 'encrypted': True}),
+]
+
+
+def _fixed(result):
+    return lambda n: result
+
+
+WIDGETS = [
+    ('number_widget', number_widget, _fixed((1234, 1200)), False),
+    ('rag_widget', rag_widget,
+     _fixed(((1, "Red"), (2, "Amber"), (3, "Green"))), False),
+    ('geck_o_meter', geck_o_meter, _fixed((50, (0, "Min"), (100, "Max"))), False),
+    ('bullet', bullet, _fixed({
+        'label': 'Revenue 2011 YTD',
+        'axis_points': [0, 200, 400, 600, 800, 1000],
+        'current': 500,
+        'comparative': 600,
+        'sublabel': 'U.S. $ in thousands',
+        'projected': [100, 900],
+    }), False),
+    ('text_widget', text_widget,
+     lambda n: [("Message <%d> & more" % i, TEXT_INFO) for i in range(n)], True),
+    ('pie_chart', pie_chart,
+     lambda n: [(i, "Slice %d" % i, "ff8800") for i in range(n)], True),
+    ('line_chart', line_chart,
+     lambda n: (list(range(n)), ["first", "last"], ["low", "high"], "ff8800"), True),
+    ('funnel', funnel,
+     lambda n: {'items': [(n - i, "Step %d" % i) for i in range(n)]}, True),
+]
+
+
+def run():
+    results = []
+    request = HttpRequest()
+    for name, decorator, make_result, sized in WIDGETS:
+        for size_name, size in SIZES if sized else [('fixed', 1)]:
+            result = make_result(size)
+            for output, kwargs in OUTPUTS:
+                view = decorator(**kwargs)(lambda request: result)
+                results.append(measure('widget', lambda: view(request), widget=name,
+                                       size=size_name, output=output))
+    return results
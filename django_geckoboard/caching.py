@@ -0,0 +1,218 @@
+"""
+Caching helpers for the Geckoboard decorators.
+"""
+from __future__ import absolute_import
+
+import logging
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections
+import six
+
+from django_geckoboard.conf import get_setting
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresher(object):
+    """
+    Runs cache refresh functions on a bounded thread pool.
+
+    At most one refresh is queued or running for each key.  The number
+    of worker threads is taken from the ``GECKOBOARD_REFRESH_WORKERS``
+    setting (default 4) when the first refresh is submitted.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args):
+        """
+        Schedule `func(*args)` unless a refresh for `key` is already
+        pending.  Return whether the refresh was scheduled.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            if self._executor is None:
+                max_workers = get_setting('GECKOBOARD_REFRESH_WORKERS', 4)
+                self._executor = ThreadPoolExecutor(max_workers)
+            self._pending.add(key)
+        try:
+            self._executor.submit(self._run, key, func, args)
+        except Exception:
+            with self._lock:
+                self._pending.discard(key)
+            raise
+        return True
+
+    def _run(self, key, func, args):
+        close_old_connections()
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("Background refresh of %s failed", key)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._pending.discard(key)
+
+
+refresher = BackgroundRefresher()
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key within a process.
+
+    The first caller for a key runs the function, later callers wait for
+    it to finish and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                six.reraise(*call.exc_info)
+            return call.result
+        try:
+            call.result = func()
+        except Exception:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+flights = SingleFlight()
+
+
+class CacheLock(object):
+    """
+    A lock shared by all processes using the same cache.
+
+    The lock expires after `timeout` seconds, so a crashed process does
+    not hold it forever.
+    """
+
+    def __init__(self, cache, key, timeout):
+        self.cache = cache
+        self.key = key
+        self.timeout = timeout
+
+    def acquire(self):
+        """Try to acquire the lock without waiting.  Return whether it was acquired."""
+        return self.cache.add(self.key, 1, self.timeout)
+
+    def release(self):
+        self.cache.delete(self.key)
+
+    def locked(self):
+        return self.cache.get(self.key) is not None
+
+
+def coalesce_via_cache(cache, key, func, timeout, poll_interval=0.05):
+    """
+    Return the value for `key`, calling `func` to compute and store it
+    only if no other process is already doing so.
+
+    While another process holds the lock for `key`, the cache is polled
+    for the value it stores.  If the lock is released or expires without
+    a value appearing, `func` is called anyway.
+    """
+    lock = CacheLock(cache, key + ':lock', timeout)
+    if lock.acquire():
+        try:
+            return func()
+        finally:
+            lock.release()
+    deadline = time.time() + timeout
+    while lock.locked() and time.time() < deadline:
+        time.sleep(poll_interval)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    value = cache.get(key)
+    if value is not None:
+        return value
+    return func()
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping that holds at most `max_size` items.  When it
+    is full, the least recently used item is evicted.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # On Python 3, OrderedDict operations are atomic, so that reads
+        # do not need the lock.
+        self._move_to_end = getattr(self._data, 'move_to_end', self._reinsert)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return the value for `key` and mark it as recently used."""
+        try:
+            value = self._data[key]
+            self._move_to_end(key)
+        except KeyError:
+            return default
+        return value
+
+    def set(self, key, value):
+        """
+        Store a value, evicting the least recently used item if full.
+        Return the evicted `(key, value)` tuple, or None.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.max_size:
+                return self._data.popitem(last=False)
+        return None
+
+    def _reinsert(self, key):
+        with self._lock:
+            self._data[key] = self._data.pop(key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
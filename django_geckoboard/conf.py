@@ -0,0 +1,59 @@
+"""
+Cached access to the Geckoboard settings.
+
+Settings are read on every widget request, so their values, and values
+derived from them, are cached.  The caches are cleared when Django
+sends the ``setting_changed`` signal, for example in tests that use
+``override_settings``.
+"""
+from __future__ import absolute_import
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+_values = {}
+_derived = {}
+_dependents = {}
+
+
+def get_setting(name, default=None):
+    """
+    Return the value of a setting, or `default` if it is not set.  The
+    value is cached until the setting changes.
+    """
+    try:
+        return _values[name]
+    except KeyError:
+        value = _values[name] = getattr(settings, name, default)
+        return value
+
+
+def cached_setting(*names):
+    """
+    Decorator for functions without arguments that compute a value from
+    the settings in `names`.  The result is cached until one of these
+    settings changes.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            try:
+                return _derived[func]
+            except KeyError:
+                value = _derived[func] = func()
+                return value
+        for name in names:
+            _dependents.setdefault(name, []).append(func)
+        return wrapper
+    return decorator
+
+
+@receiver(setting_changed)
+def _setting_changed(setting, **kwargs):
+    _values.pop(setting, None)
+    for func in _dependents.get(setting, ()):
+        _derived.pop(func, None)
@@ -0,0 +1,240 @@
+"""
+Counters maintained incrementally by model signals.
+
+A counter keeps the number of instances of a model in the cache, per
+day or hour of a date field, so that a widget view can read it without
+counting the rows in the database on every poll.
+"""
+from __future__ import absolute_import
+
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+import six
+
+from django_geckoboard.aggregates import _period_values
+from django_geckoboard.decorators import GeckoboardException
+
+
+# Django < 1.9 cannot defer the update until the transaction is
+# committed.
+on_commit = getattr(transaction, 'on_commit', None)
+
+#: All counters, by name.
+counters = {}
+
+_BUCKETS = {
+    'day': (timedelta(days=1), '%Y%m%d'),
+    'hour': (timedelta(hours=1), '%Y%m%d%H'),
+}
+
+
+class Counter(object):
+    """
+    Counts the instances of a model that match `filter`, a dictionary
+    of field values (exact lookups only, as it is also evaluated on
+    saved instances).
+
+    If `date_field` is set, instances are counted per `bucket` (``'day'``
+    or ``'hour'``) of that field, in the current time zone.  Otherwise
+    all instances are counted.
+
+    The counts are stored in the cache named by `cache_alias` for
+    `timeout` seconds (by default they do not expire) and updated with
+    atomic increments when instances are created or deleted, after the
+    transaction is committed (immediately on Django 1.8).  A count that is not in the cache is
+    computed from the database when it is read.  If `track_updates` is
+    True, updates that change the bucket of an instance or whether it
+    matches are counted as well, at the cost of a query per update.
+    Other changes, such as bulk updates and deletes, are not seen by
+    the counter; use the ``geckoboard_counters`` management command to
+    reconcile the counts with the database.
+
+    The counter is registered in ``counters`` by `name`.
+    """
+
+    def __init__(self, name, model, filter=None, date_field=None, bucket='day',
+                 cache_alias='default', timeout=None, track_updates=False):
+        if bucket not in _BUCKETS:
+            raise GeckoboardException("unknown counter bucket: %s" % bucket)
+        self._datetimes = date_field is not None and \
+            isinstance(model._meta.get_field(date_field), models.DateTimeField)
+        if date_field is not None and bucket != 'day' and not self._datetimes:
+            raise GeckoboardException("%s buckets require a DateTimeField" % bucket)
+        self.name = name
+        self.model = model
+        self.filter = filter or {}
+        self.date_field = date_field
+        self.bucket = bucket
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.track_updates = track_updates
+        self._step, self._key_format = _BUCKETS[bucket]
+        uid = 'geckoboard:counter:%s' % name
+        post_save.connect(self._post_save, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self._post_delete, sender=model, weak=False, dispatch_uid=uid)
+        if track_updates:
+            pre_save.connect(self._pre_save, sender=model, weak=False, dispatch_uid=uid)
+        counters[name] = self
+
+    def disconnect(self):
+        """Stop maintaining the counter and unregister it."""
+        uid = 'geckoboard:counter:%s' % self.name
+        for signal in (pre_save, post_save, post_delete):
+            signal.disconnect(sender=self.model, dispatch_uid=uid)
+        counters.pop(self.name, None)
+
+    def count(self, when=None):
+        """
+        Return the count for the bucket that contains `when` (by default
+        the current time), or the total count if there is no date field.
+        """
+        start = self._bucket_start(when)
+        key = self._key(start)
+        cache = caches[self.cache_alias]
+        value = cache.get(key)
+        if value is None:
+            value = self._compute(start)
+            if not cache.add(key, value, self.timeout):
+                value = cache.get(key, value)
+        return value
+
+    def current_previous(self, when=None):
+        """
+        Return a `(current, previous)` tuple for ``number_widget`` with
+        the counts for the bucket that contains `when` and the bucket
+        before it.
+        """
+        start = self._bucket_start(when)
+        if start is None:
+            raise GeckoboardException("counter %s has no date field" % self.name)
+        return self.count(start), self.count(start - self._step)
+
+    def reconcile(self, buckets=30):
+        """
+        Recompute the counts from the database and store them in the
+        cache.  For a counter with a date field, the counts of the last
+        `buckets` buckets are recomputed, in a single query.  Return
+        the number of stored counts.
+        """
+        cache = caches[self.cache_alias]
+        if self.date_field is None:
+            cache.set(self._key(None), self._compute(None), self.timeout)
+            return 1
+        start = self._bucket_start(None)
+        for i in range(buckets - 1):
+            start = self._bucket_start(start - self._step)
+        values = dict((self._key(bucket), 0) for bucket in self._bucket_starts(start))
+        queryset = self._queryset().filter(**{self.date_field + '__gte': start})
+        for when, count in _period_values(queryset, self.date_field, self.bucket):
+            key = self._key(self._bucket_start(when))
+            if key in values:
+                values[key] += count
+        cache.set_many(values, self.timeout)
+        return len(values)
+
+    def _bucket_starts(self, start):
+        end = self._bucket_start(None)
+        while start <= end:
+            yield start
+            start = self._bucket_start(start + self._step)
+
+    def _queryset(self):
+        return self.model._default_manager.filter(**self.filter)
+
+    def _compute(self, start):
+        queryset = self._queryset()
+        if start is None:
+            return queryset.count()
+        if not isinstance(start, datetime):
+            return queryset.filter(**{self.date_field: start}).count()
+        end = self._bucket_start(start + self._step)
+        return queryset.filter(**{self.date_field + '__gte': start,
+                                  self.date_field + '__lt': end}).count()
+
+    def _bucket_start(self, when):
+        """
+        Return the start of the bucket that contains `when`, or None if
+        there is no date field.
+        """
+        if self.date_field is None:
+            return None
+        if when is None:
+            when = timezone.now()
+        if not isinstance(when, datetime):
+            if not self._datetimes:
+                return when
+            when = datetime.combine(when, time())
+            if timezone.is_aware(timezone.now()):
+                when = timezone.make_aware(when)
+        if timezone.is_aware(when):
+            when = timezone.localtime(when)
+        if not self._datetimes:
+            return when.date()
+        if self.bucket == 'day':
+            return when.replace(hour=0, minute=0, second=0, microsecond=0)
+        return when.replace(minute=0, second=0, microsecond=0)
+
+    def _key(self, start):
+        if start is None:
+            return 'geckoboard:counter:%s' % self.name
+        return 'geckoboard:counter:%s:%s' % (self.name, start.strftime(self._key_format))
+
+    def _instance_key(self, instance):
+        """
+        Return the key of the count that includes `instance`, or None if
+        the instance is not counted.
+        """
+        for field, value in six.iteritems(self.filter):
+            if getattr(instance, field) != value:
+                return None
+        if self.date_field is None:
+            return self._key(None)
+        when = getattr(instance, self.date_field)
+        if when is None:
+            return None
+        return self._key(self._bucket_start(when))
+
+    def _pre_save(self, sender, instance, raw=False, using=None, **kwargs):
+        if raw or instance._state.adding or instance.pk is None:
+            return
+        old = sender._default_manager.using(using).filter(pk=instance.pk).first()
+        keys = instance.__dict__.setdefault('_geckoboard_counter_keys', {})
+        keys[self.name] = None if old is None else self._instance_key(old)
+
+    def _post_save(self, sender, instance, created=False, raw=False, using=None, **kwargs):
+        if raw:
+            return
+        key = self._instance_key(instance)
+        if created:
+            old_key = None
+        elif self.track_updates:
+            old_key = instance.__dict__.get('_geckoboard_counter_keys', {}).pop(self.name, key)
+        else:
+            return
+        if old_key != key:
+            self._on_commit(old_key, -1, using)
+            self._on_commit(key, 1, using)
+
+    def _post_delete(self, sender, instance, using=None, **kwargs):
+        self._on_commit(self._instance_key(instance), -1, using)
+
+    def _on_commit(self, key, delta, using):
+        if key is None:
+            return
+        incr = partial(self._incr, key, delta)
+        if on_commit is None:
+            incr()
+        else:
+            on_commit(incr, using=using)
+
+    def _incr(self, key, delta):
+        try:
+            caches[self.cache_alias].incr(key, delta)
+        except ValueError:
+            # The count is not cached; it is computed when it is read.
+            pass
@@ -4,20 +4,51 @@ Geckoboard decorators.
 from __future__ import absolute_import
 
 from collections import OrderedDict
-from functools import wraps
-from hashlib import md5
-from xml.dom.minidom import Document
+from functools import WRAPPER_ASSIGNMENTS, partial, wraps
+from hashlib import md5, sha256
+from importlib import import_module
 import base64
+import binascii
 import json
+import os
+import threading
+import time
+import zlib
+from timeit import default_timer
 
-from Crypto import Random
 from Crypto.Cipher import AES
-from django.conf import settings
-from django.http import HttpResponse, HttpResponseForbidden
-from django.utils.decorators import available_attrs
+from django.core.cache import caches
+from django.http import (
+    HttpResponse, HttpResponseForbidden, HttpResponseNotModified,
+)
+from django.utils.cache import patch_vary_headers
 from django.views.decorators.csrf import csrf_exempt
 import six
 
+try:
+    from asyncio import iscoroutinefunction
+except ImportError:  # Python 2
+    def iscoroutinefunction(func):
+        return False
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from django.utils.decorators import available_attrs
+except ImportError:  # Django >= 3.0
+    def available_attrs(fn):
+        return WRAPPER_ASSIGNMENTS
+
+from django_geckoboard.caching import (
+    CacheLock, LRUCache, coalesce_via_cache, flights, refresher,
+)
+from django_geckoboard.conf import cached_setting, get_setting
+from django_geckoboard.downsampling import DOWNSAMPLERS
+from django_geckoboard.signals import widget_timing
+
 
 TEXT_NONE = 0
 TEXT_INFO = 2
@@ -38,35 +69,305 @@ class WidgetDecorator(object):
 
     If the ``encrypted` argument is set to True, then the data will be
     encrypted using ``GECKOBOARD_PASSWORD`` (JSON only).
+
+    If the ``cache_timeout`` argument is set, the rendered response is
+    stored in the Django cache named by ``cache_alias`` (``'default'``
+    by default) for that many seconds.  While the entry is fresh,
+    neither the view nor the renderer is run.
+
+    The ``cache_timeout`` may also be a function that returns the
+    timeout for a widget variant.  It is called with a dictionary of
+    the URL keyword arguments, or of the ``vary_on`` values (see below).
+
+    If the ``stale_timeout`` argument is also set, ``cache_timeout``
+    becomes a soft limit.  An entry older than ``cache_timeout`` is
+    still returned, while a fresh one is computed in a background
+    thread.  Entries older than ``stale_timeout`` seconds are never
+    returned.
+
+    If the ``coalesce`` argument is set to True, concurrent requests for
+    the same widget variant in a process share a single call of the
+    view.  If it is set to ``'cache'``, processes also share the
+    computation through a lock in the cache (this requires
+    ``cache_timeout``).  The lock expires after ``coalesce_timeout``
+    seconds (30 by default).
+
+    If the ``min_interval`` argument is set, the view is called at most
+    once every that many seconds for each widget variant, across all
+    processes sharing the cache.  Requests in between get the last
+    rendered response, which is kept in the cache without expiry and in
+    a local LRU cache of each process.  The view is only called more
+    often if no previous response is available at all.
+
+    A widget variant is identified by the positional URL arguments and
+    all keyword URL arguments.  If the ``vary_on`` argument is set to a
+    sequence of names, only the keyword URL arguments and query string
+    parameters with those names identify a variant instead.  Other
+    parameters are then ignored by the caching, coalescing and
+    ``min_interval`` limit.
+
+    The ``max_variants`` argument bounds the number of widget variants
+    whose responses each process keeps in memory for ``min_interval``
+    (128 by default).  The least recently used variant is evicted
+    first.  Entries in the shared cache are left to its own timeouts,
+    as other processes may still use them.
+
+    If the ``etag`` argument is set to True, responses include an
+    ``ETag`` header computed from the content (and cached along with
+    it).  A GET request with a matching ``If-None-Match`` header gets a
+    304 Not Modified response without content.
+
+    If the ``compress`` argument is set to True, responses of at least
+    ``compress_min_size`` bytes (200 by default) are compressed using
+    gzip, or brotli if it is installed, depending on the
+    ``Accept-Encoding`` request header.  The compressed content of
+    cached responses is kept in a local LRU cache of each process, so
+    that each encoding is compressed once, when a client first asks
+    for it.
+
+    Asynchronous (coroutine function) views are supported as well.  The
+    wrapped view is then a coroutine function too.
+
+    If a receiver is connected to the
+    ``django_geckoboard.signals.widget_timing`` signal, the wall time of
+    each phase of a request is measured and sent to it.
     """
     def __new__(cls, *args, **kwargs):
         obj = object.__new__(cls)
+        obj._identity = repr((cls.__module__, cls.__name__,
+                              sorted((name, _stable_repr(value))
+                                     for name, value in kwargs.items())))
         obj._encrypted = None
         if 'encrypted' in kwargs:
             obj._encrypted = kwargs.pop('encrypted')
-        obj._format = None
-        if 'format' in kwargs:
-            obj._format = kwargs.pop('format')
-        obj.data = kwargs
+        format = kwargs.pop('format', None)
+        # A fixed format is resolved once, instead of per request.
+        obj._format = _FORMATS.get(format, 'xml') if format else None
+        obj._cache_timeout = kwargs.pop('cache_timeout', None)
+        obj._cache_alias = kwargs.pop('cache_alias', 'default')
+        obj._stale_timeout = kwargs.pop('stale_timeout', None)
+        if obj._stale_timeout is not None and obj._cache_timeout is None:
+            raise GeckoboardException("stale_timeout requires cache_timeout")
+        obj._coalesce = kwargs.pop('coalesce', False)
+        obj._coalesce_timeout = kwargs.pop('coalesce_timeout', 30)
+        if obj._coalesce == 'cache' and obj._cache_timeout is None:
+            raise GeckoboardException("coalesce='cache' requires cache_timeout")
+        obj._min_interval = kwargs.pop('min_interval', None)
+        vary_on = kwargs.pop('vary_on', None)
+        obj._vary_on = None if vary_on is None else tuple(vary_on)
+        max_variants = kwargs.pop('max_variants', None)
+        obj._last_payloads = LRUCache(max_variants or 128)
+        obj._etag = kwargs.pop('etag', False)
+        compress_min_size = kwargs.pop('compress_min_size', 200)
+        obj._compress_min_size = None
+        if kwargs.pop('compress', False):
+            obj._compress_min_size = compress_min_size
+        obj._pop_arguments(kwargs)
+        # Remaining arguments are widget options, merged into every
+        # response.  They are never modified after decoration.
+        obj._options = WidgetOptions(kwargs)
         try:
             return obj(args[0])
         except IndexError:
             return obj
 
     def __call__(self, view_func):
+        wrapper = wraps(view_func, assigned=available_attrs(view_func))
+        view_id = self._view_id(view_func)
+        if iscoroutinefunction(view_func):
+            from django_geckoboard.async_views import wrap_async_view
+            _wrapped_view = wrapper(wrap_async_view(self, view_func, view_id))
+            _wrapped_view.geckoboard_decorator = self
+            _wrapped_view.geckoboard_view_id = view_id
+            # Set the attribute directly, as csrf_exempt returns a
+            # synchronous wrapper on older Django versions.
+            _wrapped_view.csrf_exempt = True
+            return _wrapped_view
+
         def _wrapped_view(request, *args, **kwargs):
+            timer = _phase_timer()
             if not _is_api_key_correct(request):
+                timer.stop('auth')
+                timer.send(self, view_func, request)
                 return HttpResponseForbidden("Geckoboard API key incorrect")
-            view_result = view_func(request, *args, **kwargs)
-            data = self._convert_view_result(view_result)
+            timer.stop('auth')
+            format, negotiated = self._format, False
+            if format is None:
+                format, negotiated = _get_format(request)
+            render = partial(self._render_view, view_func, request, args, kwargs, format,
+                             timer)
+            if self._cache_timeout is None and not self._coalesce \
+                    and self._min_interval is None:
+                payload = render()
+            else:
+                variant = self._get_variant(request, kwargs)
+                key = _cache_key(view_id, args, variant, format, self._encrypted)
+                if self._min_interval is not None:
+                    render = partial(self._render_at_interval, key, render)
+                if self._cache_timeout is not None:
+                    payload = self._get_cached_payload(key, render,
+                                                       self._get_timeout(variant))
+                elif self._coalesce:
+                    payload = flights.do(key, render)
+                else:
+                    payload = render()
+            response = _make_response(request, payload, self._compress_min_size, negotiated)
+            timer.send(self, view_func, request)
+            return response
+        _wrapped_view = csrf_exempt(wrapper(_wrapped_view))
+        _wrapped_view.geckoboard_decorator = self
+        _wrapped_view.geckoboard_view_id = view_id
+        return _wrapped_view
+
+    def _view_id(self, view_func):
+        """
+        Return the identity of a view decorated by this decorator, used
+        in its cache keys.
+
+        It covers the decorator class and arguments, the view function
+        and the number of times the same function was decorated in the
+        same way before, so that closures created by a factory and
+        lambdas get their own identity.  The identity is the same in all
+        processes that decorate their views in the same order.
+        """
+        view_name = getattr(view_func, '__qualname__', view_func.__name__)
+        identity = repr((self._identity, view_func.__module__, view_name))
+        with _view_counts_lock:
+            count = _view_counts[identity] = _view_counts.get(identity, -1) + 1
+        return md5(('%s:%d' % (identity, count)).encode('utf8')).hexdigest()
+
+    def _get_variant(self, request, kwargs):
+        """
+        Return a dictionary of the URL keyword arguments and query string
+        parameters that identify the widget variant of a request.
+        """
+        if self._vary_on is None:
+            return kwargs
+        variant = {}
+        for name in self._vary_on:
+            if name in kwargs:
+                variant[name] = kwargs[name]
+            elif name in request.GET:
+                variant[name] = request.GET[name]
+        return variant
+
+    def _get_timeout(self, variant):
+        if callable(self._cache_timeout):
+            return self._cache_timeout(variant)
+        return self._cache_timeout
+
+    def _get_cached_payload(self, key, render, timeout):
+        cache = caches[self._cache_alias]
+        payload = cache.get(key)
+        if payload is None:
+            refresh = partial(self._refresh_payload, key, render, timeout)
+            if self._coalesce == 'cache':
+                refresh = partial(coalesce_via_cache, cache, key, refresh,
+                                  self._coalesce_timeout)
+            if self._coalesce:
+                return flights.do(key, refresh)
+            return refresh()
+        if self._is_stale(payload):
+            refresher.submit(key, self._background_refresh, key, render, timeout)
+        return payload
+
+    def _background_refresh(self, key, render, timeout):
+        if self._coalesce != 'cache':
+            self._refresh_payload(key, render, timeout)
+            return
+        lock = CacheLock(caches[self._cache_alias], key + ':lock', self._coalesce_timeout)
+        if lock.acquire():
             try:
-                self.data.update(data)
-            except ValueError:
-                self.data = data
-            content, content_type = _render(request, self.data, self._encrypted, self._format)
-            return HttpResponse(content, content_type=content_type)
-        wrapper = wraps(view_func, assigned=available_attrs(view_func))
-        return csrf_exempt(wrapper(_wrapped_view))
+                self._refresh_payload(key, render, timeout)
+            finally:
+                lock.release()
+
+    def _refresh_payload(self, key, render, timeout):
+        return self._store_payload(key, render(), timeout)
+
+    def _store_payload(self, key, payload, timeout):
+        caches[self._cache_alias].set(key, payload, self._storage_timeout(payload, timeout))
+        return payload
+
+    def _storage_timeout(self, payload, timeout):
+        """
+        Return the cache timeout for storing `payload`, which is fresh
+        for `timeout` seconds.
+        """
+        if self._stale_timeout is None:
+            return timeout
+        payload['expires'] = time.time() + timeout
+        return self._stale_timeout
+
+    def _render_at_interval(self, key, render):
+        if not self._open_gate(key):
+            payload = self._last_payload(key)
+            if payload is not None:
+                return payload
+        return self._store_last_payload(key, render())
+
+    def _open_gate(self, key):
+        """
+        Return whether the view may be called for `key`.  If so, it may
+        not be called again for ``min_interval`` seconds.
+        """
+        return caches[self._cache_alias].add(key + ':gate', True, self._min_interval)
+
+    def _last_payload(self, key):
+        payload = caches[self._cache_alias].get(key + ':last')
+        if payload is None:
+            payload = self._last_payloads.get(key)
+        return payload
+
+    def _store_last_payload(self, key, payload):
+        caches[self._cache_alias].set(key + ':last', payload, None)
+        self._last_payloads.set(key, payload)
+        return payload
+
+    def _is_stale(self, payload):
+        return self._stale_timeout is not None and payload['expires'] <= time.time()
+
+    def _render_view(self, view_func, request, args, kwargs, format, timer):
+        timer.start()
+        view_result = view_func(request, *args, **kwargs)
+        timer.stop('view')
+        return self._make_payload(view_result, format, timer)
+
+    def _make_payload(self, view_result, format, timer=None):
+        """
+        Convert and render a view result.  The phases are recorded on
+        `timer`, if it is given.
+        """
+        if timer is None:
+            timer = _NULL_TIMER
+        timer.start()
+        data = self._convert_view_result(view_result)
+        timer.stop('convert')
+        # JSON output is encrypted here instead of by the renderer, so
+        # that encryption is timed separately.  The XML renderer rejects
+        # encryption.
+        encrypt = self._encrypted and format == 'json'
+        content, content_type = _render(data, self._encrypted and not encrypt, format,
+                                        self._options)
+        timer.stop('serialize')
+        if encrypt:
+            content = _encrypt(content)
+            timer.stop('encrypt')
+        if isinstance(content, six.text_type):
+            content = content.encode('utf8')
+        payload = {'content': content, 'content_type': content_type}
+        if self._etag:
+            payload['etag'] = '"%s"' % md5(content).hexdigest()
+        if self._cache_timeout is not None and self._compress_min_size is not None \
+                and len(content) >= self._compress_min_size:
+            # Identifies the content in the local cache of compressed
+            # content, without hashing it.
+            payload['token'] = os.urandom(8)
+        return payload
+
+    def _pop_arguments(self, kwargs):
+        # Extending classes pop their own decorator arguments here.
+        pass
 
     def _convert_view_result(self, data):
         # Extending classes do view result mangling here.
@@ -74,6 +375,76 @@ class WidgetDecorator(object):
 
 widget = WidgetDecorator
 
+_view_counts = {}
+_view_counts_lock = threading.Lock()
+
+
+def _stable_repr(value):
+    """
+    Return a representation of a decorator argument that does not
+    depend on memory addresses, so that it is the same in all processes.
+    """
+    if callable(value):
+        return '%s.%s' % (getattr(value, '__module__', None),
+                          getattr(value, '__qualname__', getattr(value, '__name__', None)))
+    return repr(value)
+
+
+class WidgetOptions(object):
+    """
+    The options passed to a widget decorator.
+
+    Options are static, so their JSON and XML serializations are
+    computed only once and spliced into each response.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.xml = {}
+        for tag, value in data.items():
+            fragment = _xml_fragment(tag, value)
+            if fragment:
+                self.xml[tag] = fragment
+        self._json_prefixes = {}
+
+    def merge(self, data):
+        """
+        Return the view data merged with the options, without modifying
+        either.  Values from the view take precedence.  Data that is not
+        a dictionary is returned as is.
+        """
+        if not self.data or not isinstance(data, dict):
+            return data
+        merged = dict(self.data)
+        merged.update(data)
+        return merged
+
+    def splices_into(self, data):
+        """
+        Return whether the serialized options can be spliced into the
+        serialized view data, which is the case if the data is a
+        dictionary that does not override any option.
+        """
+        if not isinstance(data, dict):
+            return False
+        for key in self.data:
+            if key in data:
+                return False
+        return True
+
+    def json_prefix(self, encoder):
+        """
+        Return the start of a JSON object containing the options, up to
+        and including the separator for the next member.
+        """
+        try:
+            return self._json_prefixes[encoder]
+        except KeyError:
+            separator = encoder([0, 0])[2:-2]
+            prefix = encoder(self.data)[:-1] + separator
+            self._json_prefixes[encoder] = prefix
+            return prefix
+
 
 class NumberWidgetDecorator(WidgetDecorator):
     """
@@ -81,16 +452,16 @@ class NumberWidgetDecorator(WidgetDecorator):
 
     The decorated view must return a tuple `(current, [previous])`, where
     `current` is the current value and `previous` is the previous value
-    of the measured quantity..
+    of the measured quantity..  NumPy arrays and scalars are accepted as
+    well.
     """
 
     def _convert_view_result(self, result):
+        result = _tolist(result)
         if not isinstance(result, (tuple, list)):
             result = [result]
-        result = list(result)
-        for k, v in enumerate(result):
-            result[k] = v if isinstance(v, dict) else {'value': v}
-        return {'item': result}
+        return {'item': [v if isinstance(v, dict) else {'value': _tolist(v)}
+                         for v in result]}
 
 number_widget = NumberWidgetDecorator
 
@@ -161,20 +532,23 @@ class PieChartWidgetDecorator(WidgetDecorator):
 
     The decorated view must return a list of tuples `(value, label,
     color)`.  The color parameter is a string 'RRGGBB[TT]' representing
-    red, green, blue and optionally transparency.
+    red, green, blue and optionally transparency.  A NumPy array of
+    values or a NumPy structured array of rows is accepted as well, and
+    rows may contain NumPy scalars.
     """
 
     def _convert_view_result(self, result):
         items = []
-        for elem in result:
+        for elem in _tolist(result):
+            elem = _tolist(elem)
             if not isinstance(elem, (tuple, list)):
                 elem = [elem]
             item = OrderedDict()
-            item['value'] = elem[0]
+            item['value'] = _tolist(elem[0])
             if len(elem) > 1:
-                item['label'] = elem[1]
+                item['label'] = _tolist(elem[1])
             if len(elem) > 2:
-                item['colour'] = elem[2]
+                item['colour'] = _tolist(elem[2])
             items.append(item)
         return {'item': items}
 
@@ -186,34 +560,58 @@ class LineChartWidgetDecorator(WidgetDecorator):
     Geckoboard Line chart decorator.
 
     The decorated view must return a tuple `(values, x_axis, y_axis,
-    [color])`.  The `values` parameter is a list of data points.  The
+    [color])`.  The `values` parameter is a list of data points, or a
+    NumPy array, ``array.array`` or memoryview.  The
     `x-axis` parameter is a label string or a list of strings, that will
     be placed on the X-axis.  The `y-axis` parameter works similarly for
     the Y-axis.  If there are more than one axis label, they are placed
     evenly along the axis.  The optional `color` parameter is a string
     ``'RRGGBB[TT]'`` representing red, green, blue and optionally
     transparency.
+
+    If the `max_points` argument is set, series with more values are
+    downsampled to at most that many points.  The `downsample` argument
+    selects the algorithm from ``DOWNSAMPLERS``: ``'lttb'`` (default)
+    or ``'minmax'``.
     """
 
+    def _pop_arguments(self, kwargs):
+        self._max_points = kwargs.pop('max_points', None)
+        downsample = kwargs.pop('downsample', 'lttb')
+        if downsample not in DOWNSAMPLERS:
+            raise GeckoboardException("unknown downsample algorithm: %s" % downsample)
+        self._downsample = DOWNSAMPLERS[downsample]
+        if self._max_points is not None and self._max_points < 3:
+            raise GeckoboardException("max_points must be at least 3")
+
     def _convert_view_result(self, result):
         data = OrderedDict()
-        data['item'] = list(result[0])
+        values = result[0]
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        else:
+            values = _tolist_items(values)
+        if self._max_points is not None:
+            values = self._downsample(values, self._max_points)
+        data['item'] = values
         data['settings'] = OrderedDict()
 
         if len(result) > 1:
-            x_axis = result[1]
+            x_axis = _tolist(result[1])
             if x_axis is None:
                 x_axis = ''
             if not isinstance(x_axis, (tuple, list)):
                 x_axis = [x_axis]
+            x_axis = _tolist_items(x_axis)
             data['settings']['axisx'] = x_axis
 
         if len(result) > 2:
-            y_axis = result[2]
+            y_axis = _tolist(result[2])
             if y_axis is None:
                 y_axis = ''
             if not isinstance(y_axis, (tuple, list)):
                 y_axis = [y_axis]
+            y_axis = _tolist_items(y_axis)
             data['settings']['axisy'] = y_axis
 
         if len(result) > 3:
@@ -267,7 +665,7 @@ class FunnelWidgetDecorator(WidgetDecorator):
     The decorated view must return a dictionary with at least an `items`
     entry: `{'items': [(100, '100 %'), (50, '50 %')]}`.
 
-    Optional keys are:
+    Optional keys, which may also be passed as decorator arguments, are:
 
         type:       'standard' (default) or 'reverse'. Determines the
                     order of the colours.
@@ -286,8 +684,12 @@ class FunnelWidgetDecorator(WidgetDecorator):
             items.sort(reverse=True)
 
         data["item"] = [{"value": k, "label": v} for k, v in items]
-        data["type"] = result.get('type', 'standard')
-        data["percentage"] = result.get('percentage', 'show')
+        # Decorator options are used unless the view overrides them.
+        for key, default in (('type', 'standard'), ('percentage', 'show')):
+            if key in result:
+                data[key] = result[key]
+            elif key not in self._options.data:
+                data[key] = default
         return data
 
 funnel = FunnelWidgetDecorator
@@ -332,6 +734,9 @@ class BulletWidgetDecorator(WidgetDecorator):
             if key not in result:
                 raise RuntimeError("Key %s is required" % key)
 
+        # Scaling updates some values, do not modify the view's dictionary.
+        result = dict(result)
+
         # Handle singleton current and projected
         current = result['current']
         projected = result.get('projected', None)
@@ -423,15 +828,253 @@ bullet = BulletWidgetDecorator
 
 
 def _is_api_key_correct(request):
-    """Return whether the Geckoboard API key on the request is correct."""
-    api_key = getattr(settings, 'GECKOBOARD_API_KEY', None)
-    if api_key is None:
+    """
+    Return whether the Geckoboard API key on the request is correct.
+
+    The key is compared by its SHA-256 digest, so that the time taken
+    does not depend on how much of the key is correct.  Digests of
+    recently seen ``Authorization`` headers are cached.
+    """
+    digests = _api_key_digests()
+    if digests is None:
         return True
-    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
-    if len(auth) == 2:
-        if auth[0].lower() == b'basic':
-            request_key = base64.b64decode(auth[1]).split(b':')[0]
-            return request_key == api_key
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if not header:
+        return False
+    digest = _auth_digests.get(header)
+    if digest is None:
+        digest = _auth_digest(header)
+        _auth_digests.set(header, digest)
+    return digest in digests
+
+
+_auth_digests = LRUCache(256)
+
+
+@cached_setting('GECKOBOARD_API_KEY')
+def _api_key_digests():
+    """
+    Return the set of digests of the valid API keys, or None if the
+    ``GECKOBOARD_API_KEY`` setting is not set.  The setting is a key or,
+    to rotate keys, a list or tuple of keys.
+    """
+    api_keys = get_setting('GECKOBOARD_API_KEY')
+    if api_keys is None:
+        return None
+    if isinstance(api_keys, (six.text_type, six.binary_type)):
+        api_keys = [api_keys]
+    return frozenset(_key_digest(api_key) for api_key in api_keys)
+
+
+def _auth_digest(header):
+    """
+    Return the digest of the API key in a basic authentication header,
+    or an empty string if the header is invalid.
+    """
+    if isinstance(header, six.text_type):
+        header = header.encode('latin-1', 'replace')
+    auth = header.split()
+    if len(auth) != 2 or auth[0].lower() != b'basic':
+        return b''
+    try:
+        credentials = base64.b64decode(auth[1])
+    except (binascii.Error, TypeError, ValueError):
+        return b''
+    return _key_digest(credentials.split(b':')[0])
+
+
+def _key_digest(api_key):
+    if isinstance(api_key, six.text_type):
+        api_key = api_key.encode('utf8')
+    return sha256(api_key).digest()
+
+
+def _tolist(value):
+    """
+    Convert NumPy arrays and scalars, ``array.array`` and memoryview
+    objects to (lists of) Python values.  The conversion is done in C,
+    without iterating in Python.  Other values are returned unchanged.
+    """
+    tolist = getattr(value, 'tolist', None)
+    if tolist is None:
+        return value
+    return tolist()
+
+
+def _tolist_items(values):
+    """
+    Return a list of the items of `values` converted with `_tolist`,
+    such as a list of NumPy scalars.  The items are only converted one
+    by one if any of them needs it.
+    """
+    if not isinstance(values, list):
+        values = list(values)
+    if any(hasattr(item_type, 'tolist') for item_type in set(map(type, values))):
+        return [_tolist(value) for value in values]
+    return values
+
+
+def _phase_timer():
+    """
+    Return a timer for the phases of a request, or one that does nothing
+    if no receiver is connected to the ``widget_timing`` signal.
+    """
+    if widget_timing.receivers:
+        return _PhaseTimer()
+    return _NULL_TIMER
+
+
+class _PhaseTimer(object):
+    """
+    Measures the wall time of the phases of a request.  A phase runs from
+    the last call of `start` or `stop` to the call of `stop`.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._started = self._last = default_timer()
+
+    def start(self):
+        self._last = default_timer()
+
+    def stop(self, phase):
+        now = default_timer()
+        self.timings[phase] = now - self._last
+        self._last = now
+
+    def send(self, decorator, view_func, request):
+        # Send a copy, as a background refresh may still record phases.
+        widget_timing.send(sender=type(decorator), decorator=decorator, view=view_func,
+                           request=request, timings=dict(self.timings),
+                           duration=default_timer() - self._started)
+
+
+class _NullTimer(object):
+    """A phase timer that does nothing."""
+
+    def start(self):
+        pass
+
+    def stop(self, phase):
+        pass
+
+    def send(self, decorator, view_func, request):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _make_response(request, payload, compress_min_size=None, negotiated=False):
+    """
+    Return the response for a rendered payload.  If `compress_min_size`
+    is not None, content of at least that size is compressed if the
+    client accepts it.  If `negotiated` is True, the format was chosen
+    from the ``Accept`` header.
+    """
+    content = payload['content']
+    etag = payload.get('etag')
+    encoding = None
+    if compress_min_size is not None and len(content) >= compress_min_size:
+        encoding = _choose_encoding(request)
+    if encoding is not None and etag is not None:
+        etag = '%s-%s"' % (etag[:-1], encoding)
+    if etag is not None and request.method in ('GET', 'HEAD') \
+            and _etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        if encoding is not None:
+            content = _compress(payload, encoding)
+        response = HttpResponse(content, content_type=payload['content_type'])
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+    if etag is not None:
+        response['ETag'] = etag
+    vary = []
+    if negotiated:
+        vary.append('Accept')
+    if compress_min_size is not None:
+        vary.append('Accept-Encoding')
+    if vary:
+        patch_vary_headers(response, vary)
+    return response
+
+
+def _gzip(content):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+_COMPRESSORS = {'gzip': _gzip}
+if brotli is not None:
+    # The default quality of 11 is about 50 times slower than gzip.
+    _COMPRESSORS['br'] = partial(brotli.compress, quality=4)
+
+_compressed = LRUCache(128)
+
+
+def _compress(payload, encoding):
+    """
+    Return the content of a payload compressed with `encoding`.  The
+    compressed content of cached payloads is kept in a local LRU cache.
+    """
+    token = payload.get('token')
+    if token is None:
+        return _COMPRESSORS[encoding](payload['content'])
+    key = (token, encoding)
+    content = _compressed.get(key)
+    if content is None:
+        content = _COMPRESSORS[encoding](payload['content'])
+        _compressed.set(key, content)
+    return content
+
+
+def _choose_encoding(request):
+    """
+    Return the preferred content encoding accepted by the client, or
+    None.  Brotli is preferred over gzip.
+    """
+    accepted = _parse_accept(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for encoding in ('br', 'gzip'):
+        # An explicit refusal (q=0) takes precedence over "*".
+        if encoding in _COMPRESSORS and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def _parse_accept(header):
+    """
+    Parse an ``Accept`` or ``Accept-Encoding`` header into a dictionary
+    that maps the values to their quality.  Refused values have quality
+    0.
+    """
+    accepted = {}
+    for part in header.split(','):
+        params = part.strip().split(';')
+        value = params[0].strip().lower()
+        q = 1.0
+        for param in params[1:]:
+            name, _, q_value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(q_value)
+                except ValueError:
+                    q = 0.0
+        accepted[value] = q
+    return accepted
+
+
+def _etag_matches(request, etag):
+    """Return whether the ``If-None-Match`` header matches the ETag."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag or candidate == '*':
+            return True
     return False
 
 
@@ -443,90 +1086,317 @@ def _derive_key_and_iv(password, salt, key_length, iv_length):
     return d[:key_length], d[key_length:key_length+iv_length]
 
 
+_derived_keys = {}
+
+
+def _get_salt_key_and_iv(password):
+    """
+    Return a salt and the key and IV derived from it.
+
+    Normally a new salt is used for every response.  If the
+    ``GECKOBOARD_SALT_ROTATION`` setting is set, the salt and derived key
+    are reused for that many seconds.  The IV is then reused too, so
+    responses with a common prefix share a ciphertext prefix until the
+    salt changes.
+    """
+    rotation = get_setting('GECKOBOARD_SALT_ROTATION')
+    if rotation:
+        try:
+            expires, salt, key, iv = _derived_keys[password]
+            if expires > time.time():
+                return salt, key, iv
+        except KeyError:
+            pass
+    salt = os.urandom(AES.block_size - len(b'Salted__'))
+    key, iv = _derive_key_and_iv(password, salt, 32, AES.block_size)
+    if rotation:
+        _derived_keys.clear()
+        _derived_keys[password] = (time.time() + rotation, salt, key, iv)
+    return salt, key, iv
+
+
 def _encrypt(data):
     """Equivalent to OpenSSL using 256 bit AES in CBC mode"""
-    BS = AES.block_size
+    salt, key, iv = _get_salt_key_and_iv(_get_password())
+    n = AES.block_size - len(data) % AES.block_size
+    ciphertext = AES.new(key, AES.MODE_CBC, iv).encrypt(data + six.int2byte(n) * n)
+    return base64.b64encode(b''.join((b'Salted__', salt, ciphertext)))
 
-    def pad(s):
-        n = BS - len(s) % BS
-        char = chr(n).encode('utf8')
-        return s + n * char
 
-    password = settings.GECKOBOARD_PASSWORD
-    salt = Random.new().read(BS - len('Salted__'))
-    key, iv = _derive_key_and_iv(password, salt, 32, BS)
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    encrypted = b'Salted__' + salt + cipher.encrypt(pad(data))
-    return base64.b64encode(encrypted)
+@cached_setting('GECKOBOARD_PASSWORD')
+def _get_password():
+    """Return the ``GECKOBOARD_PASSWORD`` setting as bytes."""
+    password = get_setting('GECKOBOARD_PASSWORD')
+    if password is None:
+        raise GeckoboardException("encryption requires the GECKOBOARD_PASSWORD setting")
+    if isinstance(password, six.text_type):
+        password = password.encode('utf8')
+    return password
 
 
-def _render(request, data, encrypted, format=None):
+def _cache_key(view_id, args, variant, format, encrypted):
     """
-    Render the data to Geckoboard. If the `format` parameter is passed
-    to the widget it defines the output format. Otherwise the output
-    format is based on the `format` request parameter.
+    Return the cache key for a rendered widget response.
 
-    A `format` paramater of ``json`` or ``2`` renders JSON output, any
-    other value renders XML.
+    The key covers the decorated view (see `WidgetDecorator._view_id`),
+    the positional URL arguments, the `variant`
+    dictionary (see `WidgetDecorator._get_variant`), the output format
+    and whether the output is encrypted, so that different variants of
+    the same widget never share an entry.
     """
-    if not format:
-        format = request.POST.get('format', '')
-    if not format:
-        format = request.GET.get('format', '')
-    if format == 'json' or format == '2':
-        return _render_json(data, encrypted)
-    else:
-        return _render_xml(data, encrypted)
+    variant = repr((view_id, args, sorted(variant.items()), format, bool(encrypted)))
+    return 'geckoboard:widget:%s' % md5(variant.encode('utf8')).hexdigest()
+
 
+def _get_format(request):
+    """
+    Return a `(format, negotiated)` tuple for the request.  The output
+    format, either ``'json'`` or ``'xml'``, is based on the `format`
+    query string parameter, the `format` form parameter (except for GET
+    and HEAD requests, so that the body of a poll is never parsed) or
+    the ``Accept`` header, in that order.  `negotiated` is True if the
+    format was chosen from the ``Accept`` header, so that the response
+    varies on it.
+
+    A `format` paramater of ``json`` or ``2`` selects JSON output, any
+    other value selects XML.  Without a parameter, JSON is selected if
+    the client prefers ``application/json`` to XML.
+    """
+    format = request.GET.get('format')
+    if not format and request.method not in ('GET', 'HEAD'):
+        format = request.POST.get('format')
+    if format:
+        return _FORMATS.get(format, 'xml'), False
+    accepted = _parse_accept(request.META.get('HTTP_ACCEPT', ''))
+    xml_q = max(accepted.get('application/xml', 0), accepted.get('text/xml', 0))
+    if accepted.get('application/json', 0) > xml_q:
+        return 'json', True
+    return 'xml', True
 
-def _render_json(data, encrypted=False):
-    data_json = json.dumps(data).encode('utf8')
+
+_FORMATS = {'json': 'json', '2': 'json'}
+
+
+def _render(data, encrypted, format, options=None):
+    """
+    Render the data, merged with the widget options, to Geckoboard in
+    the format returned by `_get_format`.
+    """
+    return _RENDERERS[format](data, encrypted, options)
+
+
+def _render_json(data, encrypted=False, options=None):
+    encoder = _get_json_encoder()
+    if options is None or not options.data:
+        data_json = encoder(data)
+    elif options.splices_into(data):
+        data_json = encoder(data)
+        if data_json == b'{}':
+            data_json = encoder(options.data)
+        else:
+            data_json = options.json_prefix(encoder) + data_json[1:]
+    else:
+        data_json = encoder(options.merge(data))
     if encrypted:
         data_json = _encrypt(data_json)
     return data_json, 'application/json'
 
 
-def _render_xml(data, encrypted=False):
+JSON_BACKENDS = ('json', 'orjson', 'ujson')
+
+_json_encoders = {}
+
+
+def _get_json_encoder(backend=None):
+    """
+    Return a function that encodes data to JSON bytes, using the backend
+    named by the ``GECKOBOARD_JSON_BACKEND`` setting.
+
+    The backend is one of ``JSON_BACKENDS`` or ``'auto'``, which selects
+    the fastest installed backend.  The standard library ``json`` module
+    is used if the requested backend is not installed.
+    """
+    if backend is None:
+        backend = get_setting('GECKOBOARD_JSON_BACKEND', 'json')
+    try:
+        return _json_encoders[backend]
+    except KeyError:
+        pass
+    if backend == 'auto':
+        names = ('orjson', 'ujson')
+    elif backend in JSON_BACKENDS:
+        names = (backend,)
+    else:
+        raise GeckoboardException("unknown JSON backend: %s" % backend)
+    for name in names:
+        encoder = _load_json_encoder(name)
+        if encoder is not None:
+            break
+    else:
+        encoder = _encode_json
+    _json_encoders[backend] = encoder
+    return encoder
+
+
+def _load_json_encoder(name):
+    """Return the encoder for a JSON backend, or None if it is not installed."""
+    if name == 'json':
+        return _encode_json
+    try:
+        module = import_module(name)
+    except ImportError:
+        return None
+    if name == 'orjson':
+        return module.dumps
+    return lambda data: module.dumps(data).encode('utf8')
+
+
+def _encode_json(data):
+    return json.dumps(data).encode('utf8')
+
+
+def _render_xml(data, encrypted=False, options=None):
+    """
+    Serialize the data, merged with the widget options, to XML.
+
+    Dictionary keys become elements, in sorted order.  Lists and tuples
+    repeat the enclosing element for each item.  Other values become
+    text.  The output is written directly into a buffer, without
+    building a DOM tree, and is the same as that of
+    ``xml.dom.minidom.Document.toxml``.
+    """
     if encrypted:
         raise ValueError("encryption requested for XML output but unsupported")
-    doc = Document()
-    root = doc.createElement('root')
-    doc.appendChild(root)
-    _build_xml(doc, root, data)
-    return doc.toxml(), 'application/xml'
-
-
-def _build_xml(doc, parent, data):
-    if isinstance(data, (tuple, list)):
-        _build_list_xml(doc, parent, data)
-    elif isinstance(data, dict):
-        _build_dict_xml(doc, parent, data)
+    buf = ['<?xml version="1.0" ?>']
+    write = buf.append
+    # The stack holds work in reverse order, as (kind, tag, value)
+    # tuples.  Using an explicit stack instead of recursion means deeply
+    # nested data cannot hit the recursion limit.
+    if options is not None and options.data and isinstance(data, dict):
+        # Splice in the serialized options as children of the root.
+        write('<root')
+        open_tag = True  # a start tag still needs to be closed by '>' or '/>'
+        stack = [(_XML_END, 'root', None)]
+        stack.extend(reversed(_xml_children(data, options.xml)))
     else:
-        _build_str_xml(doc, parent, data)
+        open_tag = False
+        stack = [(_XML_ELEMENT, 'root', data)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        kind, tag, value = pop()
+        if kind is _XML_MARKUP:
+            if open_tag:
+                write('>')
+                open_tag = False
+            write(value)
+        elif kind is _XML_END:
+            if open_tag:
+                write('/>')
+                open_tag = False
+            else:
+                write('</%s>' % tag)
+        elif kind is _XML_ELEMENT:
+            if open_tag:
+                write('>')
+            write('<' + tag)
+            open_tag = True
+            push((_XML_END, tag, None))
+            push((_XML_CONTENT, None, value))
+        elif isinstance(value, (tuple, list)):
+            stack.extend([(_XML_CONTENT, None, item) for item in reversed(value)])
+        elif isinstance(value, dict):
+            stack.extend(reversed(_xml_children(value)))
+        else:
+            if open_tag:
+                write('>')
+                open_tag = False
+            write(_escape_xml(six.text_type(value)))
+    return ''.join(buf), 'application/xml'
+
 
+_RENDERERS = {
+    'json': _render_json,
+    'xml': _render_xml,
+}
 
-def _build_str_xml(doc, parent, data):
-    parent.appendChild(doc.createTextNode(six.text_type(data)))
+_XML_ELEMENT = 'element'
+_XML_END = 'end'
+_XML_CONTENT = 'content'
+_XML_MARKUP = 'markup'
 
+_SORTED_TAGS = {}
 
-def _build_list_xml(doc, parent, data):
-    for item in data:
-        _build_xml(doc, parent, item)
 
+def _xml_children(data, fragments=None):
+    """
+    Return the stack entries for the elements of a dictionary, in
+    document order.  Runs of elements with scalar values are serialized
+    at once into a single markup entry.
 
-def _build_dict_xml(doc, parent, data):
-    tags = sorted(data.keys())  # order tags testing ease
+    The `fragments` dictionary maps extra tags to their serialized
+    elements.  They are used for tags that are not in the data.
+    """
+    children = []
+    markup = []
+    if fragments:
+        tags = sorted(set(data).union(fragments))
+    else:
+        tags = _sorted_tags(data)
     for tag in tags:
+        if tag not in data:
+            markup.append(fragments[tag])
+            continue
         item = data[tag]
-        if isinstance(item, (list, tuple)):
-            for subitem in item:
-                elem = doc.createElement(tag)
-                _build_xml(doc, elem, subitem)
-                parent.appendChild(elem)
-        else:
-            elem = doc.createElement(tag)
-            _build_xml(doc, elem, item)
-            parent.appendChild(elem)
+        if not isinstance(item, (list, tuple)):
+            item = (item,)
+        for subitem in item:
+            if isinstance(subitem, (list, tuple, dict)):
+                if markup:
+                    children.append((_XML_MARKUP, None, ''.join(markup)))
+                    markup = []
+                children.append((_XML_ELEMENT, tag, subitem))
+            else:
+                markup.append('<%s>%s</%s>' % (tag, _escape_xml(six.text_type(subitem)), tag))
+    if markup:
+        children.append((_XML_MARKUP, None, ''.join(markup)))
+    return children
+
+
+def _xml_fragment(tag, value):
+    """Return the serialized elements for a tag and its value."""
+    content = _render_xml({tag: value})[0]
+    if content.endswith('<root/>'):
+        return ''
+    return content[len('<?xml version="1.0" ?><root>'):-len('</root>')]
+
+
+def _sorted_tags(data):
+    """
+    Return the keys of a dictionary in sorted order.  Widgets usually
+    produce many dictionaries with the same keys, so the order is
+    remembered for each key sequence.
+    """
+    keys = tuple(data)
+    try:
+        return _SORTED_TAGS[keys]
+    except KeyError:
+        if len(_SORTED_TAGS) >= 256:
+            _SORTED_TAGS.clear()
+        tags = _SORTED_TAGS[keys] = sorted(keys)
+        return tags
+
+
+def _escape_xml(text):
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '"' in text:
+        text = text.replace('"', '&quot;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
 
 
 class GeckoboardException(Exception):
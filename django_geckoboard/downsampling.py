@@ -0,0 +1,83 @@
+"""
+Downsampling of line chart series.
+
+A line chart widget is a few hundred pixels wide, so a series of many
+thousands of points can be reduced to a few hundred without visibly
+changing its shape.  The functions in this module take a list of
+values, evenly spaced along the X-axis, and return a shorter list.
+"""
+from __future__ import absolute_import, division
+
+from six.moves import range
+
+
+def lttb(values, max_points):
+    """
+    Downsample using the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last values are kept.  The others are divided into
+    `max_points` - 2 buckets, from each of which the value is kept that
+    forms the largest triangle with the value kept from the previous
+    bucket and the average of the next bucket.  This preserves peaks
+    and the overall shape of the series.
+    """
+    n = len(values)
+    if n <= max_points:
+        return values
+    if max_points < 3:
+        return [values[0], values[-1]][:max_points]
+    every = (n - 2) / (max_points - 2)
+    sampled = [values[0]]
+    a = 0
+    for i in range(max_points - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = (avg_start + avg_end - 1) / 2
+        avg_y = sum(values[avg_start:avg_end]) / (avg_end - avg_start)
+        ax = a
+        ay = values[a]
+        dx = ax - avg_x
+        dy = avg_y - ay
+        max_area = -1
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            # Twice the triangle area; the factor does not matter.
+            area = abs(dx * (values[j] - ay) - (ax - j) * dy)
+            if area > max_area:
+                max_area = area
+                a = j
+        sampled.append(values[a])
+    sampled.append(values[-1])
+    return sampled
+
+
+def minmax(values, max_points):
+    """
+    Downsample by keeping the minimum and maximum of each bucket.
+
+    The values are divided into `max_points` / 2 buckets, from each of
+    which the lowest and highest values are kept in their original
+    order.  All spikes are preserved, but the series looks noisier than
+    with `lttb`.
+    """
+    n = len(values)
+    if n <= max_points:
+        return values
+    buckets = max(max_points // 2, 1)
+    size = n / buckets
+    sampled = []
+    for b in range(buckets):
+        bucket = values[int(b * size):int((b + 1) * size)]
+        low = bucket.index(min(bucket))
+        high = bucket.index(max(bucket))
+        if low > high:
+            low, high = high, low
+        sampled.append(bucket[low])
+        if high != low:
+            sampled.append(bucket[high])
+    return sampled
+
+
+DOWNSAMPLERS = {
+    'lttb': lttb,
+    'minmax': minmax,
+}
@@ -0,0 +1,28 @@
+"""
+Reconcile Geckoboard counters with the database.
+"""
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_geckoboard.counters import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute Geckoboard counters from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help="counters to reconcile (default: all)")
+        parser.add_argument('--buckets', type=int, default=30,
+                            help="number of recent buckets to recompute (default: 30)")
+
+    def handle(self, *args, **options):
+        names = options['names'] or sorted(counters)
+        for name in names:
+            if name not in counters:
+                raise CommandError("unknown counter: %s" % name)
+        for name in names:
+            count = counters[name].reconcile(options['buckets'])
+            if options['verbosity'] > 0:
+                self.stdout.write("%s: %d counts" % (name, count))
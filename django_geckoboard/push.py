@@ -0,0 +1,167 @@
+"""
+Geckoboard push API client.
+
+Instead of waiting for Geckoboard to poll a widget URL, widget data can
+be pushed to Geckoboard.  The data is converted and rendered by the
+same widget decorators that are used for polled widgets.
+"""
+from __future__ import absolute_import
+
+import json
+import socket
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+import six
+from six.moves import http_client, queue
+from six.moves.urllib.parse import urlsplit
+
+from django_geckoboard.conf import get_setting
+from django_geckoboard.decorators import GeckoboardException, _render_json
+
+
+PUSH_URL = 'https://push.geckoboard.com/v1/send/'
+
+
+class PushError(GeckoboardException):
+    """
+    Represents a failed push to Geckoboard.  The `status` attribute is
+    the HTTP status code, or None if no response was received.
+    """
+
+    def __init__(self, message, status=None, body=None):
+        super(PushError, self).__init__(message)
+        self.status = status
+        self.body = body
+
+
+class PushClient(object):
+    """
+    Pushes widget data to Geckoboard.
+
+    Connections are kept open and reused.  At most `max_connections`
+    requests are sent concurrently.  Requests that fail because of a
+    connection error or a 429 or 5xx response are retried up to
+    `retries` times, waiting `backoff` seconds before the first retry
+    and doubling the wait for each following one.
+
+    The API key defaults to the ``GECKOBOARD_API_KEY`` setting, or the
+    first key if the setting is a list or tuple of keys.
+    """
+
+    def __init__(self, api_key=None, url=PUSH_URL, max_connections=4, retries=3,
+                 backoff=0.5, timeout=10):
+        if api_key is None:
+            api_key = get_setting('GECKOBOARD_API_KEY')
+            if isinstance(api_key, (list, tuple)):
+                api_key = api_key[0]
+        if isinstance(api_key, six.binary_type):
+            api_key = api_key.decode('utf8')
+        self.api_key = api_key
+        parts = urlsplit(url)
+        if parts.scheme == 'https':
+            self._connection_class = http_client.HTTPSConnection
+        else:
+            self._connection_class = http_client.HTTPConnection
+        self._host = parts.netloc
+        self._path = parts.path
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def push(self, decorator, widget_key, result):
+        """
+        Push a view result to a widget.
+
+        The `decorator` is a widget decorator, such as ``number_widget``
+        or ``number_widget(absolute='true')``, that converts and renders
+        the result in the same way as for a polled widget.  Return the
+        decoded response from Geckoboard.
+        """
+        return self._send(widget_key, self._render(decorator, result))
+
+    def push_many(self, pushes):
+        """
+        Push a number of view results concurrently.
+
+        The `pushes` argument is an iterable of `(decorator, widget_key,
+        result)` tuples.  Return a list with the response or the
+        `PushError` for each push, in order.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_connections)
+        futures = [self._executor.submit(self._push_or_error, *push) for push in pushes]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Close all idle connections and stop the worker threads."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _push_or_error(self, decorator, widget_key, result):
+        try:
+            return self.push(decorator, widget_key, result)
+        except PushError as e:
+            return e
+
+    def _render(self, decorator, result):
+        if isinstance(decorator, type):
+            decorator = decorator()
+        data = decorator._convert_view_result(result)
+        content = _render_json(data, options=decorator._options)[0]
+        return b''.join((b'{"api_key": ', json.dumps(self.api_key).encode('utf8'),
+                         b', "data": ', content, b'}'))
+
+    def _send(self, widget_key, body):
+        path = self._path + widget_key
+        headers = {'Content-Type': 'application/json'}
+        attempt = 0
+        while True:
+            try:
+                status, content = self._request(path, body, headers)
+            except (socket.error, http_client.HTTPException) as e:
+                error = PushError("push to %s failed: %s" % (widget_key, e))
+            else:
+                if status < 300:
+                    return json.loads(content.decode('utf8')) if content else None
+                error = PushError("push to %s failed with status %d" % (widget_key, status),
+                                  status, content)
+                if status != 429 and status < 500:
+                    raise error
+            if attempt >= self.retries:
+                raise error
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def _request(self, path, body, headers):
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connection_class(self._host, timeout=self.timeout)
+            try:
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                content = response.read()
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._idle.put(connection)
+            return response.status, content
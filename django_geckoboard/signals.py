@@ -0,0 +1,19 @@
+"""
+Geckoboard signals.
+"""
+from __future__ import absolute_import
+
+from django.dispatch import Signal
+
+
+#: Sent after a widget view has handled a request.  The sender is the
+#: widget decorator class.  The arguments are the ``decorator`` instance,
+#: the undecorated ``view``, the ``request``, ``timings``, a dictionary
+#: that maps the phases of the request that ran to their wall time in
+#: seconds, and ``duration``, the total wall time in seconds.
+#:
+#: The phases are ``'auth'`` (the API key check), ``'view'``,
+#: ``'convert'`` (conversion of the view result), ``'serialize'`` and
+#: ``'encrypt'``.  Phases are missing when they did not run for the
+#: request, for example because the response was cached.
+widget_timing = Signal()
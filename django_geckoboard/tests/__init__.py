@@ -2,4 +2,16 @@
 Tests for django-geckoboard.
 """
 
+import sys
+
+if sys.version_info >= (3, 5):
+    from django_geckoboard.tests.async_tests import *
+from django_geckoboard.tests.test_aggregates import *
+from django_geckoboard.tests.test_caching import *
+from django_geckoboard.tests.test_conf import *
+from django_geckoboard.tests.test_counters import *
 from django_geckoboard.tests.test_decorators import *
+from django_geckoboard.tests.test_downsampling import *
+from django_geckoboard.tests.test_push import *
+from django_geckoboard.tests.test_timeseries import *
+from django_geckoboard.tests.test_views import *
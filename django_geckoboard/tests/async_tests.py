@@ -0,0 +1,232 @@
+"""
+Tests for asynchronous views.
+
+This module uses ``async def``, which is a syntax error before Python
+3.5.  It is named so that test discovery skips it, and is imported by
+the test package only on Python 3.5 and later.
+"""
+
+import asyncio
+import json
+import threading
+
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponseForbidden
+
+from django_geckoboard.async_views import _cache_call, flights, refresher
+from django_geckoboard.decorators import number_widget, widget
+from django_geckoboard.signals import widget_timing
+from django_geckoboard.tests.utils import TestCase
+from django_geckoboard.views import dashboard
+
+
+class AsyncViewTestCase(TestCase):
+    """
+    Tests for decorating asynchronous views.
+    """
+
+    def setUp(self):
+        super(AsyncViewTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.calls = []
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        super(AsyncViewTestCase, self).tearDown()
+
+    async def view(self, request, *args, **kwargs):
+        self.calls.append(None)
+        await asyncio.sleep(0.01)
+        return {'count': len(self.calls)}
+
+    def request(self, format='json'):
+        req = HttpRequest()
+        req.method = 'GET'
+        req.GET['format'] = format
+        return req
+
+    def run_view(self, view, *requests):
+        return self.loop.run_until_complete(
+            asyncio.gather(*[view(request) for request in requests]))
+
+    def test_wrapper(self):
+        w = widget(self.view)
+        self.assertTrue(asyncio.iscoroutinefunction(w))
+        self.assertTrue(w.csrf_exempt)
+        self.assertEqual('view', w.__name__)
+
+    def test_render(self):
+        async def view(request):
+            return (10, 9)
+
+        resp, = self.run_view(number_widget(format='json', absolute='true')(view),
+                              HttpRequest())
+        self.assertEqual({'item': [{'value': 10}, {'value': 9}], 'absolute': 'true'},
+                         json.loads(resp.content.decode('utf8')))
+
+    def test_xml(self):
+        resp, = self.run_view(widget(self.view), self.request('xml'))
+        self.assertEqual(b'<?xml version="1.0" ?><root><count>1</count></root>',
+                         resp.content)
+
+    def test_api_key(self):
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        resp, = self.run_view(widget(self.view), self.request())
+        self.assertTrue(isinstance(resp, HttpResponseForbidden), resp)
+        self.assertEqual([], self.calls)
+
+    def test_timing(self):
+        timings = []
+
+        def receiver(sender, **kwargs):
+            timings.append(kwargs['timings'])
+        widget_timing.connect(receiver)
+        try:
+            self.run_view(widget(self.view), self.request())
+        finally:
+            widget_timing.disconnect(receiver)
+        self.assertEqual(set(['auth', 'view', 'convert', 'serialize']), set(timings[0]))
+
+    def test_cached(self):
+        w = widget(cache_timeout=60)(self.view)
+        self.run_view(w, self.request())
+        resp, = self.run_view(w, self.request())
+        self.assertEqual(b'{"count": 1}', resp.content)
+        self.assertEqual(1, len(self.calls))
+
+    def test_coalesce(self):
+        responses = self.run_view(widget(coalesce=True)(self.view),
+                                  *[self.request() for i in range(5)])
+        self.assertEqual([b'{"count": 1}'] * 5, [resp.content for resp in responses])
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual({}, flights._tasks)
+
+    def test_coalesce_via_cache(self):
+        responses = self.run_view(widget(cache_timeout=60, coalesce='cache')(self.view),
+                                  *[self.request() for i in range(5)])
+        self.assertEqual([b'{"count": 1}'] * 5, [resp.content for resp in responses])
+        self.assertEqual(1, len(self.calls))
+
+    def test_min_interval(self):
+        w = widget(min_interval=60)(self.view)
+        self.run_view(w, self.request())
+        resp, = self.run_view(w, self.request())
+        self.assertEqual(b'{"count": 1}', resp.content)
+        self.assertEqual(1, len(self.calls))
+
+    def test_vary_on(self):
+        w = widget(vary_on=['team'], cache_timeout=lambda variant: 60)(self.view)
+        first, second = self.request(), self.request()
+        first.GET['team'] = second.GET['team'] = 'a'
+        second.GET['t'] = '123'
+        self.run_view(w, first)
+        resp, = self.run_view(w, second)
+        self.assertEqual(b'{"count": 1}', resp.content)
+        self.assertEqual(1, len(self.calls))
+
+    def test_stale_while_revalidate(self):
+        w = widget(cache_timeout=0, stale_timeout=60)(self.view)
+        self.run_view(w, self.request())
+        first, second = self.run_view(w, self.request(), self.request())
+        self.assertEqual(b'{"count": 1}', first.content)
+        self.assertEqual(b'{"count": 1}', second.content)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual({}, refresher._tasks)
+        resp, = self.run_view(w, self.request())
+        self.assertEqual(b'{"count": 2}', resp.content)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+
+class AsyncCacheTestCase(TestCase):
+    """
+    Tests for cache access from asynchronous views.
+    """
+
+    def setUp(self):
+        super(AsyncCacheTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        super(AsyncCacheTestCase, self).tearDown()
+
+    def test_async_method(self):
+        class AsyncCache(object):
+            def get(self, key):
+                raise AssertionError("synchronous method called")
+
+            async def aget(self, key):
+                return key
+
+        self.assertEqual('a', self.loop.run_until_complete(_cache_call(AsyncCache(), 'get', 'a')))
+
+    def test_not_in_event_loop(self):
+        threads = []
+        methods = ('get', 'set', 'add', 'delete')
+
+        def record(method):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return method(*args, **kwargs)
+            return wrapper
+
+        async def view(request):
+            return 1
+
+        for name in methods:
+            if not hasattr(cache, 'a' + name):
+                setattr(cache, name, record(getattr(cache, name)))
+        try:
+            w = widget(cache_timeout=60, coalesce='cache', min_interval=60)(view)
+            request = HttpRequest()
+            request.GET['format'] = 'json'
+            for i in range(2):
+                resp = self.loop.run_until_complete(w(request))
+                self.assertEqual(b'1', resp.content)
+        finally:
+            for name in methods:
+                cache.__dict__.pop(name, None)
+        self.assertFalse(threading.current_thread() in threads)
+
+
+class AsyncDashboardTestCase(TestCase):
+    """
+    Tests for dashboards with asynchronous views.
+    """
+
+    def setUp(self):
+        super(AsyncDashboardTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        super(AsyncDashboardTestCase, self).tearDown()
+
+    def test_dashboard(self):
+        async def fast(request):
+            return 1
+
+        async def slow(request):
+            await asyncio.sleep(5)
+            return 2
+
+        view = dashboard([('fast', widget(fast)), ('slow', widget(slow)),
+                          ('sync', number_widget(lambda r: 3))], timeout=0.1)
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        resp = self.loop.run_until_complete(view(HttpRequest()))
+        self.assertEqual({
+            'widgets': {'fast': 1, 'sync': {'item': [{'value': 3}]}},
+            'errors': {'slow': 'TimeoutError: timed out'},
+        }, json.loads(resp.content.decode('utf8')))
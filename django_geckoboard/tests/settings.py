@@ -10,6 +10,8 @@ DATABASES = {
 }
 
 INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
     'django_geckoboard',
 ]
 GECKOBOARD_PASSWORD = b'pass123'
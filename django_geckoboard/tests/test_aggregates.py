@@ -0,0 +1,110 @@
+"""
+Tests for the query helpers.
+"""
+
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test.utils import CaptureQueriesContext
+
+from django_geckoboard.aggregates import current_previous, rag_counts, rag_thresholds
+from django_geckoboard.decorators import GeckoboardException, rag_widget
+from django_geckoboard.tests.utils import TestCase
+
+
+class CurrentPreviousTestCase(TestCase):
+    """
+    Tests for ``current_previous``.
+    """
+
+    def setUp(self):
+        super(CurrentPreviousTestCase, self).setUp()
+        self.settings_manager.set(USE_TZ=False)
+        # The test package is imported before the app registry is ready.
+        self.User = User = get_user_model()
+        self.now = datetime(2020, 1, 31, 12, 0)
+        for days in (0.5, 1, 3, 8, 9, 10, 20):
+            User.objects.create(username='user%s' % days,
+                                date_joined=self.now - timedelta(days=days))
+        self.week = timedelta(weeks=1)
+
+    def test_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = current_previous(self.User.objects.all(), 'date_joined', self.week,
+                                      now=self.now)
+        self.assertEqual((3, 3), result)
+        self.assertEqual(1, len(queries))
+
+    def test_cumulative(self):
+        result = current_previous(self.User.objects.all(), 'date_joined', self.week,
+                                  cumulative=True, now=self.now)
+        self.assertEqual((7, 4), result)
+
+    def test_sum(self):
+        ids = list(self.User.objects.order_by('date_joined').values_list('pk', flat=True))
+        result = current_previous(self.User.objects.all(), 'date_joined', self.week,
+                                  aggregate='sum', field='id', now=self.now)
+        self.assertEqual((sum(ids[4:]), sum(ids[1:4])), result)
+
+    def test_avg(self):
+        result = current_previous(self.User.objects.filter(username='user1'), 'date_joined',
+                                  self.week, aggregate='avg', field='id', now=self.now)
+        self.assertEqual(self.User.objects.get(username='user1').pk, result[0])
+        self.assertEqual(None, result[1])
+
+    def test_unknown_aggregate(self):
+        self.assertRaises(GeckoboardException, current_previous, self.User.objects.all(),
+                          'date_joined', self.week, aggregate='median')
+
+
+class RAGTestCase(TestCase):
+    """
+    Tests for ``rag_counts`` and ``rag_thresholds``.
+    """
+
+    def setUp(self):
+        super(RAGTestCase, self).setUp()
+        self.User = User = get_user_model()
+        for i in range(10):
+            User.objects.create(username='user%d' % i, is_staff=i < 3,
+                                is_superuser=i < 1)
+
+    def test_counts(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = rag_counts(self.User.objects.all(), Q(is_superuser=True),
+                                Q(is_staff=True, is_superuser=False), Q(is_staff=False))
+        self.assertEqual((1, 2, 7), result)
+        self.assertEqual(1, len(queries))
+
+    def test_multi_valued_relation(self):
+        user = self.User.objects.get(username='user0')
+        for name in ('a', 'b'):
+            user.groups.create(name=name)
+        result = rag_counts(self.User.objects.all(), Q(groups__name__in=['a', 'b']),
+                            Q(groups__name='a'), Q(groups__isnull=True))
+        self.assertEqual((1, 1, 9), result)
+
+    def test_labels(self):
+        result = rag_counts(self.User.objects.all(), Q(is_superuser=True), Q(is_staff=True),
+                            Q(is_staff=False), labels=('Admins', 'Staff', 'Users'))
+        self.assertEqual(((1, 'Admins'), (3, 'Staff'), (7, 'Users')), result)
+
+    def test_rag_widget(self):
+        view = rag_widget(format='json')(
+            lambda request: rag_counts(self.User.objects.all(), Q(is_superuser=True),
+                                       Q(is_staff=True), Q(is_staff=False)))
+        self.assertJSONEqual('{"item": [{"value": 1}, {"value": 3}, {"value": 7}]}',
+                             view(HttpRequest()).content.decode('utf8'))
+
+    def test_thresholds(self):
+        pks = sorted(self.User.objects.values_list('pk', flat=True))
+        result = rag_thresholds(self.User.objects.all(), 'pk', pks[2], pks[5])
+        self.assertEqual((2, 3, 5), result)
+
+    def test_thresholds_lower_is_better(self):
+        pks = sorted(self.User.objects.values_list('pk', flat=True))
+        result = rag_thresholds(self.User.objects.all(), 'pk', pks[5], pks[2])
+        self.assertEqual((4, 3, 3), result)
@@ -0,0 +1,193 @@
+"""
+Tests for the Geckoboard caching helpers.
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+from django_geckoboard.caching import (
+    BackgroundRefresher, CacheLock, LRUCache, SingleFlight, coalesce_via_cache, logger,
+)
+from django_geckoboard.tests.utils import TestCase
+
+
+class BackgroundRefresherTestCase(TestCase):
+    """
+    Tests for ``BackgroundRefresher``.
+    """
+
+    def setUp(self):
+        super(BackgroundRefresherTestCase, self).setUp()
+        self.settings_manager.set(GECKOBOARD_REFRESH_WORKERS=2)
+        self.refresher = BackgroundRefresher()
+
+    def tearDown(self):
+        self.refresher._executor.shutdown()
+        super(BackgroundRefresherTestCase, self).tearDown()
+
+    def test_one_refresh_per_key(self):
+        release = threading.Event()
+        calls = []
+
+        def refresh(name):
+            release.wait(5)
+            calls.append(name)
+
+        self.assertTrue(self.refresher.submit('a', refresh, 'a1'))
+        self.assertFalse(self.refresher.submit('a', refresh, 'a2'))
+        self.assertTrue(self.refresher.submit('b', refresh, 'b1'))
+        release.set()
+        self.refresher._executor.shutdown()
+        self.assertEqual(['a1', 'b1'], sorted(calls))
+        self.assertEqual(set(), self.refresher._pending)
+
+    def test_bounded_workers(self):
+        self.refresher.submit('a', lambda: None)
+        self.assertEqual(2, self.refresher._executor._max_workers)
+
+    def test_failure_releases_key(self):
+        def refresh():
+            raise RuntimeError("refresh failed")
+
+        logger.disabled = True
+        try:
+            self.refresher.submit('a', refresh)
+            self.refresher._executor.shutdown()
+        finally:
+            logger.disabled = False
+        self.assertEqual(set(), self.refresher._pending)
+
+
+class SingleFlightTestCase(TestCase):
+    """
+    Tests for ``SingleFlight``.
+    """
+
+    def setUp(self):
+        super(SingleFlightTestCase, self).setUp()
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def run_concurrently(self, func, count=5):
+        results = []
+
+        def call():
+            try:
+                results.append(self.flights.do('key', func))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=call) for i in range(count)]
+        threads[0].start()
+        self.assertTrue(self.started.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_coalesced(self):
+        def func():
+            self.calls.append(None)
+            self.started.set()
+            self.release.wait(5)
+            return len(self.calls)
+
+        self.assertEqual([1] * 5, self.run_concurrently(func))
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual({}, self.flights._calls)
+
+    def test_exception_shared(self):
+        def func():
+            self.calls.append(None)
+            self.started.set()
+            self.release.wait(5)
+            raise ValueError("failed")
+
+        results = self.run_concurrently(func)
+        self.assertEqual(5, len(results))
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(1, len(self.calls))
+
+    def test_sequential_calls_not_coalesced(self):
+        self.assertEqual(1, self.flights.do('key', lambda: 1))
+        self.assertEqual(2, self.flights.do('key', lambda: 2))
+
+
+class CoalesceViaCacheTestCase(TestCase):
+    """
+    Tests for ``coalesce_via_cache``.
+    """
+
+    def setUp(self):
+        super(CoalesceViaCacheTestCase, self).setUp()
+        cache.clear()
+
+    def test_lock_free(self):
+        self.assertEqual(1, coalesce_via_cache(cache, 'key', lambda: 1, 5))
+        self.assertFalse(CacheLock(cache, 'key:lock', 5).locked())
+
+    def test_waits_for_lock_holder(self):
+        lock = CacheLock(cache, 'key:lock', 5)
+        self.assertTrue(lock.acquire())
+
+        def hold():
+            time.sleep(0.1)
+            cache.set('key', 'other')
+            lock.release()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        value = coalesce_via_cache(cache, 'key', lambda: 'mine', 5, 0.01)
+        thread.join()
+        self.assertEqual('other', value)
+
+    def test_lock_released_without_value(self):
+        lock = CacheLock(cache, 'key:lock', 5)
+        lock.acquire()
+        threading.Timer(0.05, lock.release).start()
+        self.assertEqual('mine', coalesce_via_cache(cache, 'key', lambda: 'mine', 5, 0.01))
+
+
+class LRUCacheTestCase(TestCase):
+    """
+    Tests for ``LRUCache``.
+    """
+
+    def test_get(self):
+        lru = LRUCache(2)
+        self.assertEqual(None, lru.get('a'))
+        lru.set('a', 1)
+        self.assertEqual(1, lru.get('a'))
+        self.assertEqual(2, lru.get('b', 2))
+
+    def test_evict_least_recently_used(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(2, len(lru))
+        self.assertTrue('a' in lru)
+        self.assertFalse('b' in lru)
+        self.assertTrue('c' in lru)
+
+    def test_set_returns_evicted(self):
+        lru = LRUCache(1)
+        self.assertEqual(None, lru.set('a', 1))
+        self.assertEqual(None, lru.set('a', 2))
+        self.assertEqual(('a', 2), lru.set('b', 3))
+
+    def test_pop_and_clear(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(1, lru.pop('a'))
+        self.assertEqual(None, lru.pop('a'))
+        lru.clear()
+        self.assertEqual(0, len(lru))
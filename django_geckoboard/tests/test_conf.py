@@ -0,0 +1,55 @@
+"""
+Tests for the cached settings.
+"""
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from django_geckoboard import conf
+from django_geckoboard.tests.utils import TestCase
+
+
+calls = []
+
+
+@conf.cached_setting('GECKOBOARD_TEST_SETTING')
+def derived():
+    calls.append(None)
+    return conf.get_setting('GECKOBOARD_TEST_SETTING', 0) * 2
+
+
+class CachedSettingsTestCase(TestCase):
+    """
+    Tests for ``get_setting`` and ``cached_setting``.
+    """
+
+    def setUp(self):
+        super(CachedSettingsTestCase, self).setUp()
+        del calls[:]
+
+    def test_default(self):
+        self.assertEqual('x', conf.get_setting('GECKOBOARD_UNKNOWN_SETTING', 'x'))
+
+    def test_cached(self):
+        with override_settings(GECKOBOARD_TEST_SETTING=1):
+            self.assertEqual(1, conf.get_setting('GECKOBOARD_TEST_SETTING'))
+            # Changes that do not send setting_changed are not seen.
+            settings.GECKOBOARD_TEST_SETTING = 2
+            self.assertEqual(1, conf.get_setting('GECKOBOARD_TEST_SETTING'))
+
+    def test_setting_changed(self):
+        with override_settings(GECKOBOARD_TEST_SETTING=1):
+            self.assertEqual(1, conf.get_setting('GECKOBOARD_TEST_SETTING'))
+            with override_settings(GECKOBOARD_TEST_SETTING=2):
+                self.assertEqual(2, conf.get_setting('GECKOBOARD_TEST_SETTING'))
+            self.assertEqual(1, conf.get_setting('GECKOBOARD_TEST_SETTING'))
+
+    def test_derived(self):
+        with override_settings(GECKOBOARD_TEST_SETTING=1):
+            self.assertEqual(2, derived())
+            self.assertEqual(2, derived())
+            self.assertEqual(1, len(calls))
+            with override_settings(GECKOBOARD_TEST_SETTING=2):
+                self.assertEqual(4, derived())
+        self.assertEqual(0, derived())
+        self.assertEqual(3, len(calls))
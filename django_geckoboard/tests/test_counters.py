@@ -0,0 +1,168 @@
+"""
+Tests for the signal-maintained counters.
+"""
+
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from six import StringIO
+
+from django_geckoboard import aggregates
+from django_geckoboard import counters as counters_module
+from django_geckoboard.counters import Counter, counters
+from django_geckoboard.decorators import GeckoboardException
+from django_geckoboard.tests.utils import TestSettingsManager
+
+
+class CounterTestCase(TransactionTestCase):
+    """
+    Tests for ``Counter``.
+
+    Counts are updated after the transaction is committed, so these
+    tests do not run in a transaction.
+    """
+
+    def setUp(self):
+        self.settings_manager = TestSettingsManager()
+        self.settings_manager.set(USE_TZ=False)
+        cache.clear()
+        # The test package is imported before the app registry is ready.
+        self.User = get_user_model()
+        self.counters = []
+
+    def tearDown(self):
+        for counter in self.counters:
+            counter.disconnect()
+        self.settings_manager.revert()
+
+    def counter(self, name, **kwargs):
+        counter = Counter(name, self.User, **kwargs)
+        self.counters.append(counter)
+        return counter
+
+    def create(self, name, days=0, **kwargs):
+        return self.User.objects.create(
+            username=name, date_joined=datetime.now() - timedelta(days=days), **kwargs)
+
+    def test_total(self):
+        counter = self.counter('users')
+        self.create('a')
+        self.assertEqual(1, counter.count())
+        self.create('b')
+        self.assertEqual(2, counter.count())
+        self.User.objects.get(username='a').delete()
+        self.assertEqual(1, counter.count())
+
+    def test_cached(self):
+        counter = self.counter('users')
+        self.assertEqual(0, counter.count())
+        self.create('a')
+        self.User.objects.bulk_create([self.User(username='b')])
+        self.assertEqual(1, counter.count())
+        self.assertEqual(1, counter.reconcile())
+        self.assertEqual(2, counter.count())
+
+    def test_filter(self):
+        counter = self.counter('staff', filter={'is_staff': True})
+        self.assertEqual(0, counter.count())
+        self.create('a', is_staff=True)
+        self.create('b')
+        self.assertEqual(1, counter.count())
+
+    def test_buckets(self):
+        counter = self.counter('joined', date_field='date_joined')
+        self.create('a', days=1)
+        self.assertEqual((0, 1), counter.current_previous())
+        self.create('b')
+        self.create('c')
+        self.create('d', days=3)
+        self.assertEqual((2, 1), counter.current_previous())
+        three_days_ago = datetime.now() - timedelta(days=3)
+        self.assertEqual(1, counter.count(three_days_ago))
+        self.assertEqual(1, counter.count(three_days_ago.date()))
+
+    def test_hour_buckets(self):
+        counter = self.counter('joined', date_field='date_joined', bucket='hour')
+        self.User.objects.create(username='a', date_joined=datetime.now() - timedelta(hours=1))
+        self.assertEqual((0, 1), counter.current_previous())
+
+    def test_track_updates(self):
+        counter = self.counter('staff', filter={'is_staff': True}, track_updates=True)
+        user = self.create('a')
+        self.assertEqual(0, counter.count())
+        user.is_staff = True
+        user.save()
+        self.assertEqual(1, counter.count())
+        user.save()
+        self.assertEqual(1, counter.count())
+        user.is_staff = False
+        user.save()
+        self.assertEqual(0, counter.count())
+
+    def test_updates_not_tracked(self):
+        counter = self.counter('staff', filter={'is_staff': True})
+        user = self.create('a')
+        self.assertEqual(0, counter.count())
+        user.is_staff = True
+        user.save()
+        self.assertEqual(0, counter.count())
+
+    def test_reconcile_buckets(self):
+        counter = self.counter('joined', date_field='date_joined')
+        self.assertEqual((0, 0), counter.current_previous())
+        self.User.objects.bulk_create([
+            self.User(username='a', date_joined=datetime.now()),
+            self.User(username='b', date_joined=datetime.now() - timedelta(days=1)),
+            self.User(username='c', date_joined=datetime.now() - timedelta(days=1)),
+            self.User(username='d', date_joined=datetime.now() - timedelta(days=40)),
+        ])
+        self.assertEqual(30, counter.reconcile())
+        self.assertEqual((1, 2), counter.current_previous())
+
+    def test_reconcile_without_trunc(self):
+        counter = self.counter('joined', date_field='date_joined')
+        self.create('a')
+        self.create('b', days=1)
+        self.create('c', days=1)
+        cache.clear()
+        trunc = aggregates.Trunc
+        aggregates.Trunc = None
+        try:
+            self.assertEqual(30, counter.reconcile())
+        finally:
+            aggregates.Trunc = trunc
+        self.assertEqual((1, 2), counter.current_previous())
+
+    def test_without_on_commit(self):
+        counter = self.counter('users')
+        self.assertEqual(0, counter.count())
+        on_commit = counters_module.on_commit
+        counters_module.on_commit = None
+        try:
+            self.create('a')
+        finally:
+            counters_module.on_commit = on_commit
+        self.assertEqual(1, counter.count())
+
+    def test_command(self):
+        counter = self.counter('users')
+        self.assertEqual(0, counter.count())
+        self.User.objects.bulk_create([self.User(username='a')])
+        out = StringIO()
+        call_command('geckoboard_counters', 'users', stdout=out)
+        self.assertEqual("users: 1 counts\n", out.getvalue())
+        self.assertEqual(1, counter.count())
+
+    def test_disconnect(self):
+        counter = self.counter('users')
+        counter.disconnect()
+        self.assertFalse('users' in counters)
+        self.assertEqual(0, counter.count())
+        self.create('a')
+        self.assertEqual(0, counter.count())
+
+    def test_invalid_bucket(self):
+        self.assertRaises(GeckoboardException, Counter, 'users', self.User, bucket='week')
@@ -2,19 +2,35 @@
 Tests for the Geckoboard decorators.
 """
 
+import array
 import base64
 from collections import OrderedDict
 import json
-
+import sys
+import threading
+import time
+import unittest
+import zlib
+
+from Crypto.Cipher import AES
+from django.core.cache import cache
 from django.http import HttpRequest, HttpResponseForbidden
 from django_geckoboard.decorators import (
     widget, number_widget, rag_widget,
     text_widget, pie_chart, line_chart, geck_o_meter, TEXT_NONE,
-    TEXT_INFO, TEXT_WARN, funnel, bullet,
+    TEXT_INFO, TEXT_WARN, funnel, bullet, GeckoboardException,
 )
+from django_geckoboard import decorators
+from django_geckoboard.caching import refresher
+from django_geckoboard.signals import widget_timing
 from django_geckoboard.tests.utils import TestCase
 import six
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def to_u(s):
     if isinstance(s, six.text_type):
@@ -62,6 +78,36 @@ class WidgetDecoratorTestCase(TestCase):
         self.assertTrue(isinstance(resp, HttpResponseForbidden), resp)
         self.assertEqual(b'Geckoboard API key incorrect', resp.content)
 
+    def test_text_api_key(self):
+        self.settings_manager.set(GECKOBOARD_API_KEY=u'abc')
+        req = HttpRequest()
+        req.META['HTTP_AUTHORIZATION'] = "Basic %s" % to_u(base64.b64encode(b'abc:X'))
+        resp = widget(lambda r: "test")(req)
+        self.assertEqual(200, resp.status_code)
+
+    def test_api_key_rotation(self):
+        self.settings_manager.set(GECKOBOARD_API_KEY=['new', 'old'])
+        for key, status in ((b'new', 200), (b'old', 200), (b'other', 403)):
+            req = HttpRequest()
+            req.META['HTTP_AUTHORIZATION'] = "basic %s" % to_u(base64.b64encode(key))
+            self.assertEqual(status, widget(lambda r: "test")(req).status_code)
+
+    def test_invalid_authorization(self):
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        for header in ('basic', 'basic !!!', 'digest %s' % to_u(base64.b64encode(b'abc'))):
+            req = HttpRequest()
+            req.META['HTTP_AUTHORIZATION'] = header
+            resp = widget(lambda r: "test")(req)
+            self.assertTrue(isinstance(resp, HttpResponseForbidden), resp)
+
+    def test_api_key_changed(self):
+        req = HttpRequest()
+        req.META['HTTP_AUTHORIZATION'] = "basic %s" % to_u(base64.b64encode(b'abc'))
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        self.assertEqual(200, widget(lambda r: "test")(req).status_code)
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'def')
+        self.assertEqual(403, widget(lambda r: "test")(req).status_code)
+
     def test_xml_get(self):
         req = HttpRequest()
         resp = widget(format="xml")(lambda r: "test")(req)
@@ -125,6 +171,57 @@ class WidgetDecoratorTestCase(TestCase):
         self.assertEqual(b'"test"', resp.content)
         self.assertEqual(resp._headers['content-type'], ('Content-Type', 'application/json'))
 
+    def test_get_does_not_read_body(self):
+        req = HttpRequest()
+        req.method = 'GET'
+        req.POST['format'] = '2'
+        resp = widget(lambda r: "test")(req)
+        self.assertEqual(resp._headers['content-type'], ('Content-Type', 'application/xml'))
+
+    def test_query_string_before_body(self):
+        req = HttpRequest()
+        req.method = 'POST'
+        req.GET['format'] = 'json'
+        req.POST['format'] = 'xml'
+        resp = widget(lambda r: "test")(req)
+        self.assertEqual(b'"test"', resp.content)
+
+    def test_accept_header(self):
+        for accept, content_type in (
+                ('application/json', 'application/json'),
+                ('text/html, application/json;q=0.9', 'application/json'),
+                ('application/xml, application/json;q=0.5', 'application/xml'),
+                ('application/json;q=0', 'application/xml'),
+                ('*/*', 'application/xml')):
+            req = HttpRequest()
+            req.method = 'GET'
+            req.META['HTTP_ACCEPT'] = accept
+            resp = widget(lambda r: "test")(req)
+            self.assertEqual(content_type, resp['Content-Type'], accept)
+            self.assertEqual('Accept', resp['Vary'], accept)
+
+    def test_accept_header_with_compression(self):
+        req = HttpRequest()
+        req.method = 'GET'
+        req.META['HTTP_ACCEPT'] = 'application/json'
+        resp = widget(compress=True)(lambda r: "test")(req)
+        self.assertEqual('Accept, Accept-Encoding', resp['Vary'])
+
+    def test_format_parameter_before_accept_header(self):
+        req = HttpRequest()
+        req.GET['format'] = 'xml'
+        req.META['HTTP_ACCEPT'] = 'application/json'
+        resp = widget(lambda r: "test")(req)
+        self.assertEqual('application/xml', resp['Content-Type'])
+        self.assertFalse(resp.has_header('Vary'))
+        resp = widget(format='json')(lambda r: "test")(req)
+        self.assertFalse(resp.has_header('Vary'))
+
+    def test_fixed_format_resolved(self):
+        self.assertEqual('json', widget(format='2')(lambda r: "test").geckoboard_decorator._format)
+        self.assertEqual('xml', widget(format='csv')(lambda r: "test").geckoboard_decorator._format)
+        self.assertEqual(None, widget(lambda r: "test").geckoboard_decorator._format)
+
     def test_scalar_xml(self):
         resp = widget(lambda r: "test")(self.xml_request)
         self.assertEqual(b'<?xml version="1.0" ?><root>test</root>',
@@ -165,6 +262,35 @@ class WidgetDecoratorTestCase(TestCase):
             '<item><text>test2</text><value>2</value></item></root>',
             resp.content.decode('utf8'))
 
+    def test_escaped_xml(self):
+        resp = widget(lambda r: {'text': 'a & b < "c" > d'})(self.xml_request)
+        self.assertEqual(
+            b'<?xml version="1.0" ?><root>'
+            b'<text>a &amp; b &lt; &quot;c&quot; &gt; d</text></root>',
+            resp.content)
+
+    def test_empty_xml(self):
+        resp = widget(lambda r: {'settings': {}, 'text': '', 'list': []})(self.xml_request)
+        self.assertEqual(
+            b'<?xml version="1.0" ?><root><settings/><text></text></root>',
+            resp.content)
+
+    def test_nested_xml(self):
+        data = {'a': [{'c': 2, 'b': [1, None]}, 3]}
+        resp = widget(lambda r: data)(self.xml_request)
+        self.assertEqual(
+            b'<?xml version="1.0" ?><root><a><b>1</b><b>None</b><c>2</c></a>'
+            b'<a>3</a></root>',
+            resp.content)
+
+    def test_deep_xml(self):
+        data = value = {}
+        for i in range(5000):
+            value['a'] = {}
+            value = value['a']
+        resp = widget(lambda r: data)(self.xml_request)
+        self.assertTrue(resp.content.endswith(b'<a/>' + b'</a>' * 4999 + b'</root>'))
+
     def test_dict_list_json(self):
         data = [OrderedDict([('value', 1), ('text', "test1")]),
                 OrderedDict([('value', 2), ('text', "test2")])]
@@ -175,6 +301,722 @@ class WidgetDecoratorTestCase(TestCase):
             resp.content.decode('utf8'))
 
 
+def is_installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+class ETagTestCase(TestCase):
+    """
+    Tests for the ``etag`` decorator argument.
+    """
+
+    def setUp(self):
+        super(ETagTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.calls = []
+
+    def view(self, request):
+        self.calls.append(None)
+        return {'value': 1}
+
+    def request(self, if_none_match=None, method='GET'):
+        req = HttpRequest()
+        req.method = method
+        if if_none_match is not None:
+            req.META['HTTP_IF_NONE_MATCH'] = if_none_match
+        return req
+
+    def test_no_etag_by_default(self):
+        resp = widget(format='json')(self.view)(self.request())
+        self.assertFalse(resp.has_header('ETag'))
+
+    def test_etag(self):
+        w = widget(format='json', etag=True)(self.view)
+        etag = w(self.request())['ETag']
+        self.assertEqual(etag, w(self.request())['ETag'])
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+    def test_not_modified(self):
+        w = widget(format='json', etag=True)(self.view)
+        etag = w(self.request())['ETag']
+        for header in (etag, 'W/' + etag, '"other", ' + etag, '*'):
+            resp = w(self.request(header))
+            self.assertEqual(304, resp.status_code)
+            self.assertEqual(b'', resp.content)
+            self.assertEqual(etag, resp['ETag'])
+
+    def test_modified(self):
+        w = widget(format='json', etag=True)(self.view)
+        resp = w(self.request('"other"'))
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(b'{"value": 1}', resp.content)
+
+    def test_post(self):
+        w = widget(format='json', etag=True)(self.view)
+        etag = w(self.request())['ETag']
+        self.assertEqual(200, w(self.request(etag, 'POST')).status_code)
+
+    def test_cached(self):
+        w = widget(format='json', etag=True, cache_timeout=60)(self.view)
+        etag = w(self.request())['ETag']
+        self.assertEqual(304, w(self.request(etag)).status_code)
+        self.assertEqual(1, len(self.calls))
+
+
+class CompressionTestCase(TestCase):
+    """
+    Tests for the ``compress`` decorator argument.
+    """
+
+    def setUp(self):
+        super(CompressionTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.calls = []
+
+    def view(self, request):
+        self.calls.append(None)
+        return {'text': 'x' * int(request.GET.get('size', 1000))}
+
+    def request(self, accept_encoding='gzip, deflate', size=1000):
+        req = HttpRequest()
+        req.method = 'GET'
+        req.GET['size'] = str(size)
+        req.META['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        return req
+
+    def assertGzipped(self, resp, size=1000):
+        self.assertEqual('gzip', resp['Content-Encoding'])
+        content = zlib.decompress(resp.content, 16 + zlib.MAX_WBITS)
+        self.assertEqual(('{"text": "%s"}' % ('x' * size)).encode('utf8'), content)
+
+    def test_not_compressed_by_default(self):
+        resp = widget(format='json')(self.view)(self.request())
+        self.assertFalse(resp.has_header('Content-Encoding'))
+        self.assertFalse(resp.has_header('Vary'))
+
+    def test_gzip(self):
+        resp = widget(format='json', compress=True)(self.view)(self.request())
+        self.assertGzipped(resp)
+        self.assertEqual('Accept-Encoding', resp['Vary'])
+
+    def test_not_accepted(self):
+        w = widget(format='json', compress=True)(self.view)
+        for accept_encoding in ('', 'identity', 'gzip;q=0'):
+            resp = w(self.request(accept_encoding))
+            self.assertFalse(resp.has_header('Content-Encoding'))
+            self.assertEqual('Accept-Encoding', resp['Vary'])
+
+    def test_quality(self):
+        resp = widget(format='json', compress=True)(self.view)(
+            self.request('identity;q=1, gzip;q=0.5'))
+        self.assertGzipped(resp)
+
+    def test_min_size(self):
+        w = widget(format='json', compress=True, compress_min_size=500)(self.view)
+        self.assertFalse(w(self.request(size=10)).has_header('Content-Encoding'))
+        self.assertGzipped(w(self.request(size=500)), 500)
+
+    @unittest.skipUnless(decorators.brotli, "brotli is not installed")
+    def test_brotli(self):
+        resp = widget(format='json', compress=True)(self.view)(self.request('gzip, br'))
+        self.assertEqual('br', resp['Content-Encoding'])
+
+    def test_cached(self):
+        w = widget(format='json', compress=True, cache_timeout=60)(self.view)
+        w(self.request())
+        payload = cache.get(decorators._cache_key(w.geckoboard_view_id, (), {}, 'json', None))
+        self.assertFalse((payload['token'], 'br') in decorators._compressed)
+        self.assertTrue((payload['token'], 'gzip') in decorators._compressed)
+        gzip = decorators._COMPRESSORS['gzip']
+        decorators._COMPRESSORS['gzip'] = None
+        try:
+            self.assertGzipped(w(self.request()))
+        finally:
+            decorators._COMPRESSORS['gzip'] = gzip
+        self.assertEqual(1, len(self.calls))
+
+    def test_refused_encoding(self):
+        w = widget(format='json', compress=True)(self.view)
+        self.assertFalse(w(self.request('gzip;q=0, *')).has_header('Content-Encoding'))
+        self.assertGzipped(w(self.request('*')))
+
+    def test_etag(self):
+        w = widget(format='json', compress=True, etag=True)(self.view)
+        plain_etag = w(self.request(''))['ETag']
+        gzip_etag = w(self.request())['ETag']
+        self.assertEqual(plain_etag[:-1] + '-gzip"', gzip_etag)
+        req = self.request()
+        req.META['HTTP_IF_NONE_MATCH'] = gzip_etag
+        self.assertEqual(304, w(req).status_code)
+        req.META['HTTP_IF_NONE_MATCH'] = plain_etag
+        self.assertEqual(200, w(req).status_code)
+
+
+class JSONBackendTestCase(TestCase):
+    """
+    Tests for the ``GECKOBOARD_JSON_BACKEND`` setting.
+    """
+
+    def setUp(self):
+        super(JSONBackendTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        decorators._json_encoders.clear()
+        self.widget = widget(format='json')(
+            lambda r: {'item': [1, 2], 'text': u'caf\xe9'})
+
+    def tearDown(self):
+        decorators._json_encoders.clear()
+        super(JSONBackendTestCase, self).tearDown()
+
+    def assertRendered(self):
+        content = self.widget(HttpRequest()).content
+        self.assertTrue(isinstance(content, six.binary_type))
+        self.assertEqual({'item': [1, 2], 'text': u'caf\xe9'},
+                         json.loads(content.decode('utf8')))
+        return content
+
+    def test_default(self):
+        self.assertEqual(b'{"item": [1, 2], "text": "caf\\u00e9"}', self.assertRendered())
+
+    @unittest.skipUnless(is_installed('orjson'), "orjson is not installed")
+    def test_orjson(self):
+        self.settings_manager.set(GECKOBOARD_JSON_BACKEND='orjson')
+        self.assertEqual(b'{"item":[1,2],"text":"caf\xc3\xa9"}', self.assertRendered())
+
+    @unittest.skipUnless(is_installed('ujson'), "ujson is not installed")
+    def test_ujson(self):
+        self.settings_manager.set(GECKOBOARD_JSON_BACKEND='ujson')
+        self.assertRendered()
+
+    def test_auto(self):
+        self.settings_manager.set(GECKOBOARD_JSON_BACKEND='auto')
+        self.assertRendered()
+
+    def test_missing_backend(self):
+        self.settings_manager.set(GECKOBOARD_JSON_BACKEND='orjson')
+        missing = sys.modules.get('orjson')
+        sys.modules['orjson'] = None
+        try:
+            self.assertEqual(b'{"item": [1, 2], "text": "caf\\u00e9"}', self.assertRendered())
+        finally:
+            if missing is None:
+                del sys.modules['orjson']
+            else:
+                sys.modules['orjson'] = missing
+
+    def test_unknown_backend(self):
+        self.settings_manager.set(GECKOBOARD_JSON_BACKEND='xml')
+        self.assertRaises(GeckoboardException, self.widget, HttpRequest())
+
+
+def decrypt(content, password):
+    """Decrypt OpenSSL-compatible encrypted content."""
+    encrypted = base64.b64decode(content)
+    assert encrypted[:8] == b'Salted__'
+    salt = encrypted[8:16]
+    key, iv = decorators._derive_key_and_iv(password, salt, 32, 16)
+    data = AES.new(key, AES.MODE_CBC, iv).decrypt(encrypted[16:])
+    return salt, data[:-six.indexbytes(data, -1)]
+
+
+class EncryptionTestCase(TestCase):
+    """
+    Tests for encrypted widget output.
+    """
+
+    def setUp(self):
+        super(EncryptionTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY', 'GECKOBOARD_SALT_ROTATION')
+        decorators._derived_keys.clear()
+        self.widget = widget(format='json', encrypted=True)(lambda r: {'a': 'b' * 20})
+
+    def tearDown(self):
+        decorators._derived_keys.clear()
+        super(EncryptionTestCase, self).tearDown()
+
+    def test_decrypt(self):
+        salt, data = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        self.assertEqual(b'{"a": "bbbbbbbbbbbbbbbbbbbb"}', data)
+
+    def test_text_password(self):
+        self.settings_manager.set(GECKOBOARD_PASSWORD=u'pass123')
+        salt, data = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        self.assertEqual(b'{"a": "bbbbbbbbbbbbbbbbbbbb"}', data)
+
+    def test_new_salt_per_response(self):
+        salt1, data1 = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        salt2, data2 = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        self.assertNotEqual(salt1, salt2)
+        self.assertEqual({}, decorators._derived_keys)
+
+    def test_missing_password(self):
+        self.settings_manager.delete('GECKOBOARD_PASSWORD')
+        self.assertRaises(GeckoboardException, self.widget, HttpRequest())
+
+    def test_salt_rotation(self):
+        self.settings_manager.set(GECKOBOARD_SALT_ROTATION=60)
+        salt1, data1 = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        salt2, data2 = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        self.assertEqual(salt1, salt2)
+        self.assertEqual(data1, data2)
+        self.settings_manager.set(GECKOBOARD_PASSWORD=b'other')
+        salt3, data3 = decrypt(self.widget(HttpRequest()).content, b'other')
+        self.assertEqual(data1, data3)
+        self.assertEqual([b'other'], list(decorators._derived_keys))
+
+    def test_salt_expired(self):
+        self.settings_manager.set(GECKOBOARD_SALT_ROTATION=60)
+        salt1, data1 = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        expires, salt, key, iv = decorators._derived_keys[b'pass123']
+        decorators._derived_keys[b'pass123'] = (time.time() - 1, salt, key, iv)
+        salt2, data2 = decrypt(self.widget(HttpRequest()).content, b'pass123')
+        self.assertNotEqual(salt1, salt2)
+
+
+class TimingTestCase(TestCase):
+    """
+    Tests for the ``widget_timing`` signal.
+    """
+
+    def setUp(self):
+        super(TimingTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.signals = []
+        widget_timing.connect(self.receiver)
+
+    def tearDown(self):
+        widget_timing.disconnect(self.receiver)
+        super(TimingTestCase, self).tearDown()
+
+    def receiver(self, sender, **kwargs):
+        self.signals.append((sender, kwargs))
+
+    def view(self, request):
+        return (1, 2)
+
+    def test_phases(self):
+        w = number_widget(format='json')(self.view)
+        req = HttpRequest()
+        w(req)
+        [(sender, kwargs)] = self.signals
+        self.assertEqual(decorators.NumberWidgetDecorator, sender)
+        self.assertEqual(self.view, kwargs['view'])
+        self.assertEqual(req, kwargs['request'])
+        self.assertEqual(w.geckoboard_decorator, kwargs['decorator'])
+        timings = kwargs['timings']
+        self.assertEqual(set(['auth', 'view', 'convert', 'serialize']), set(timings))
+        self.assertTrue(all(t >= 0 for t in timings.values()))
+        self.assertTrue(kwargs['duration'] >= sum(timings.values()))
+
+    def test_encrypt(self):
+        w = number_widget(format='json', encrypted=True)(self.view)
+        w(HttpRequest())
+        self.assertTrue('encrypt' in self.signals[0][1]['timings'])
+
+    def test_cached(self):
+        w = number_widget(format='json', cache_timeout=60)(self.view)
+        w(HttpRequest())
+        w(HttpRequest())
+        self.assertEqual(['auth'], list(self.signals[1][1]['timings']))
+
+    def test_forbidden(self):
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        number_widget(self.view)(HttpRequest())
+        self.assertEqual(['auth'], list(self.signals[0][1]['timings']))
+
+    def test_no_receivers(self):
+        widget_timing.disconnect(self.receiver)
+        self.assertEqual(decorators._NULL_TIMER, decorators._phase_timer())
+
+
+class WidgetConcurrencyTestCase(TestCase):
+    """
+    Tests for concurrent requests to a single decorated view.
+    """
+
+    def setUp(self):
+        super(WidgetConcurrencyTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+
+    def test_threaded_requests(self):
+        w = number_widget(format='json', absolute='true')(
+            lambda r: (int(r.GET['value']), 0))
+        errors = []
+
+        def worker(n):
+            request = HttpRequest()
+            request.GET['value'] = str(n)
+            expected = {'item': [{'value': n}, {'value': 0}], 'absolute': 'true'}
+            for i in range(200):
+                content = json.loads(w(request).content.decode('utf8'))
+                if content != expected:
+                    errors.append(content)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+
+    def test_options_not_replaced(self):
+        w = widget(format='json', absolute='true')(
+            lambda r: r.GET.get('data', {'value': 1}))
+        req = HttpRequest()
+        req.GET['data'] = 'text'
+        self.assertEqual(b'"text"', w(req).content)
+        self.assertJSONEqual('{"value": 1, "absolute": "true"}',
+                             w(HttpRequest()).content.decode('utf8'))
+
+    def test_view_overrides_options(self):
+        w = widget(format='json', absolute='true')(lambda r: {'absolute': 'false'})
+        self.assertJSONEqual('{"absolute": "false"}', w(HttpRequest()).content.decode('utf8'))
+
+    def test_options_json(self):
+        w = widget(format='json', absolute='true')(lambda r: {'value': 1})
+        self.assertEqual(b'{"absolute": "true", "value": 1}', w(HttpRequest()).content)
+        w = widget(format='json', absolute='true')(lambda r: {})
+        self.assertEqual(b'{"absolute": "true"}', w(HttpRequest()).content)
+
+    def test_options_xml(self):
+        w = widget(format='xml', b='option', d=[1, 2])(
+            lambda r: {'a': 1, 'c': {'x': 2}, 'd': 3})
+        self.assertEqual(
+            b'<?xml version="1.0" ?><root><a>1</a><b>option</b>'
+            b'<c><x>2</x></c><d>3</d></root>',
+            w(HttpRequest()).content)
+        w = widget(format='xml', b='option')(lambda r: {})
+        self.assertEqual(b'<?xml version="1.0" ?><root><b>option</b></root>',
+                         w(HttpRequest()).content)
+
+
+class WidgetCacheTestCase(TestCase):
+    """
+    Tests for the ``cache_timeout`` decorator argument.
+    """
+
+    def setUp(self):
+        super(WidgetCacheTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.calls = []
+
+    def view(self, request, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return {'count': len(self.calls)}
+
+    def request(self, format):
+        req = HttpRequest()
+        req.GET['format'] = format
+        return req
+
+    def test_cached(self):
+        w = widget(cache_timeout=60)(self.view)
+        first = w(self.request('json'))
+        second = w(self.request('json'))
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second._headers['content-type'], ('Content-Type', 'application/json'))
+
+    def test_not_cached_by_default(self):
+        w = widget(self.view)
+        w(self.request('json'))
+        w(self.request('json'))
+        self.assertEqual(2, len(self.calls))
+
+    def test_format_variants(self):
+        w = widget(cache_timeout=60)(self.view)
+        json_resp = w(self.request('json'))
+        xml_resp = w(self.request('xml'))
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual(b'{"count": 1}', json_resp.content)
+        self.assertEqual(b'<?xml version="1.0" ?><root><count>2</count></root>',
+                         xml_resp.content)
+        self.assertEqual(json_resp.content, w(self.request('2')).content)
+        self.assertEqual(2, len(self.calls))
+
+    def test_encrypted_variant(self):
+        widget(cache_timeout=60)(self.view)(self.request('json'))
+        resp = widget(encrypted=True, cache_timeout=60)(self.view)(self.request('json'))
+        self.assertEqual(2, len(self.calls))
+        self.assertNotEqual(b'{"count": 1}', resp.content)
+
+    def test_url_arguments(self):
+        w = widget(cache_timeout=60)(self.view)
+        w(self.request('json'), team='a')
+        w(self.request('json'), team='b')
+        w(self.request('json'), team='a')
+        self.assertEqual([((), {'team': 'a'}), ((), {'team': 'b'})], self.calls)
+
+    def test_views_from_factory(self):
+        def make(metric):
+            @number_widget(format='json', cache_timeout=60)
+            def view(request):
+                return metric
+            return view
+        self.assertEqual(b'{"item": [{"value": 1}]}', make(1)(self.request('json')).content)
+        self.assertEqual(b'{"item": [{"value": 2}]}', make(2)(self.request('json')).content)
+
+    def test_lambdas(self):
+        w1 = number_widget(format='json', cache_timeout=60)(lambda r: 1)
+        w2 = number_widget(format='json', cache_timeout=60)(lambda r: 2)
+        w1(self.request('json'))
+        self.assertEqual(b'{"item": [{"value": 2}]}', w2(self.request('json')).content)
+
+    def test_options(self):
+        w1 = number_widget(format='json', cache_timeout=60)(self.view)
+        w2 = number_widget(format='json', cache_timeout=60, absolute='true')(self.view)
+        w1(self.request('json'))
+        self.assertEqual({'item': [{'count': 2}], 'absolute': 'true'},
+                         json.loads(w2(self.request('json')).content.decode('utf8')))
+
+    def test_view_id(self):
+        # The identity depends on the decoration order, not the process.
+        decorator = widget(cache_timeout=60, stale_timeout=61)
+        identity = repr((decorator._identity, self.view.__module__,
+                         getattr(self.view, '__qualname__', self.view.__name__)))
+        first = decorator._view_id(self.view)
+        self.assertNotEqual(first, decorator._view_id(self.view))
+        decorators._view_counts.pop(identity)
+        self.assertEqual(first, decorator._view_id(self.view))
+
+    def test_api_key_checked(self):
+        w = widget(cache_timeout=60)(self.view)
+        w(self.request('json'))
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        resp = w(self.request('json'))
+        self.assertTrue(isinstance(resp, HttpResponseForbidden), resp)
+
+    def wait_for_refreshes(self):
+        for i in range(500):
+            if not refresher._pending:
+                return
+            time.sleep(0.01)
+        self.fail("background refresh did not finish")
+
+    def test_stale_while_revalidate(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def view(request):
+            if self.calls:
+                started.set()
+                release.wait(5)
+            self.calls.append(None)
+            return {'count': len(self.calls)}
+
+        w = widget(cache_timeout=0, stale_timeout=60)(view)
+        self.assertEqual(b'{"count": 1}', w(self.request('json')).content)
+        self.assertEqual(b'{"count": 1}', w(self.request('json')).content)
+        self.assertTrue(started.wait(5))
+        # A refresh is already running, so no second one is scheduled.
+        self.assertEqual(b'{"count": 1}', w(self.request('json')).content)
+        release.set()
+        self.wait_for_refreshes()
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual(b'{"count": 2}', w(self.request('json')).content)
+        self.wait_for_refreshes()
+
+    def test_stale_timeout_requires_cache_timeout(self):
+        self.assertRaises(GeckoboardException, widget, stale_timeout=60)
+
+    def test_coalesce_cache_requires_cache_timeout(self):
+        self.assertRaises(GeckoboardException, widget, coalesce='cache')
+
+    def concurrent_requests(self, w, count=5):
+        started = threading.Event()
+        release = threading.Event()
+        responses = []
+
+        def view(request):
+            self.calls.append(None)
+            started.set()
+            release.wait(5)
+            return {'count': len(self.calls)}
+
+        w = w(view)
+        threads = [threading.Thread(target=lambda: responses.append(w(self.request('json'))))
+                   for i in range(count)]
+        threads[0].start()
+        self.assertTrue(started.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return [resp.content for resp in responses]
+
+    def test_coalesce(self):
+        contents = self.concurrent_requests(widget(coalesce=True))
+        self.assertEqual([b'{"count": 1}'] * 5, contents)
+        self.assertEqual(1, len(self.calls))
+
+    def test_coalesce_cached(self):
+        contents = self.concurrent_requests(widget(cache_timeout=60, coalesce=True))
+        self.assertEqual([b'{"count": 1}'] * 5, contents)
+        self.assertEqual(1, len(self.calls))
+
+    def test_coalesce_via_cache(self):
+        contents = self.concurrent_requests(widget(cache_timeout=60, coalesce='cache'))
+        self.assertEqual([b'{"count": 1}'] * 5, contents)
+        self.assertEqual(1, len(self.calls))
+
+
+class MinIntervalTestCase(TestCase):
+    """
+    Tests for the ``min_interval`` decorator argument.
+    """
+
+    def setUp(self):
+        super(MinIntervalTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.calls = []
+
+    def view(self, request, *args, **kwargs):
+        self.calls.append(None)
+        return {'count': len(self.calls)}
+
+    def request(self):
+        req = HttpRequest()
+        req.GET['format'] = 'json'
+        return req
+
+    def test_last_payload(self):
+        w = widget(min_interval=60)(self.view)
+        responses = [w(self.request()) for i in range(3)]
+        self.assertEqual([b'{"count": 1}'] * 3, [resp.content for resp in responses])
+        self.assertEqual(1, len(self.calls))
+
+    def test_interval_passed(self):
+        w = widget(min_interval=0.05)(self.view)
+        w(self.request())
+        time.sleep(0.1)
+        self.assertEqual(b'{"count": 2}', w(self.request()).content)
+
+    def test_shared_through_cache(self):
+        # Another process uses the gate and last response in the cache,
+        # but has no local copy of the last response.
+        w = widget(min_interval=60)(self.view)
+        w(self.request())
+        w.geckoboard_decorator._last_payloads.clear()
+        self.assertEqual(b'{"count": 1}', w(self.request()).content)
+        self.assertEqual(1, len(self.calls))
+
+    def test_evicted(self):
+        w = widget(min_interval=60)(self.view)
+        w(self.request())
+        cache.delete(decorators._cache_key(w.geckoboard_view_id, (), {}, 'json', None) + ':last')
+        self.assertEqual(b'{"count": 1}', w(self.request()).content)
+        # Without any previous response, the view is called.
+        w2 = widget(min_interval=60)(self.view)
+        self.assertEqual(b'{"count": 2}', w2(self.request()).content)
+
+    def test_with_cache_timeout(self):
+        w = widget(min_interval=60, cache_timeout=0, stale_timeout=60)(self.view)
+        w(self.request())
+        w(self.request())
+        for i in range(500):
+            if not refresher._pending:
+                break
+            time.sleep(0.01)
+        self.assertEqual(b'{"count": 1}', w(self.request()).content)
+        self.assertEqual(1, len(self.calls))
+
+
+class VaryOnTestCase(TestCase):
+    """
+    Tests for the ``vary_on`` and ``max_variants`` decorator arguments.
+    """
+
+    def setUp(self):
+        super(VaryOnTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.calls = []
+
+    def view(self, request, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return {'count': len(self.calls)}
+
+    def request(self, **params):
+        req = HttpRequest()
+        req.GET['format'] = 'json'
+        req.GET.update(params)
+        return req
+
+    def test_query_parameters(self):
+        w = widget(vary_on=['team'], cache_timeout=60)(self.view)
+        self.assertEqual(b'{"count": 1}', w(self.request(team='a')).content)
+        self.assertEqual(b'{"count": 1}', w(self.request(team='a', t='123')).content)
+        self.assertEqual(b'{"count": 2}', w(self.request(team='b')).content)
+        self.assertEqual(b'{"count": 3}', w(self.request()).content)
+
+    def test_url_arguments(self):
+        w = widget(vary_on=['team'], cache_timeout=60)(self.view)
+        w(self.request(), 'x', team='a', page=1)
+        self.assertEqual(b'{"count": 1}', w(self.request(), 'x', team='a', page=2).content)
+        self.assertEqual(b'{"count": 2}', w(self.request(), 'y', team='a', page=1).content)
+        self.assertEqual(b'{"count": 3}', w(self.request(), 'x', team='b', page=1).content)
+        # URL arguments take precedence over query parameters.
+        self.assertEqual(b'{"count": 3}',
+                         w(self.request(team='a'), 'x', team='b', page=1).content)
+
+    def test_query_parameters_ignored_by_default(self):
+        w = widget(cache_timeout=60)(self.view)
+        w(self.request(team='a'))
+        self.assertEqual(b'{"count": 1}', w(self.request(team='b')).content)
+        self.assertEqual(b'{"count": 2}', w(self.request(), team='b').content)
+
+    def test_with_min_interval(self):
+        w = widget(vary_on=['team'], min_interval=60)(self.view)
+        w(self.request(team='a'))
+        self.assertEqual(b'{"count": 1}', w(self.request(team='a', t='1')).content)
+        self.assertEqual(b'{"count": 2}', w(self.request(team='b')).content)
+
+    def test_timeout_function(self):
+        variants = []
+
+        def timeout(variant):
+            variants.append(variant)
+            return 0 if variant.get('team') == 'live' else 60
+        w = widget(vary_on=['team'], cache_timeout=timeout)(self.view)
+        w(self.request(team='live', t='1'))
+        self.assertEqual(b'{"count": 2}', w(self.request(team='live')).content)
+        w(self.request(team='a'))
+        self.assertEqual(b'{"count": 3}', w(self.request(team='a')).content)
+        self.assertEqual({'team': 'live'}, variants[0])
+
+    def test_timeout_function_with_stale_timeout(self):
+        w = widget(cache_timeout=lambda variant: 60, stale_timeout=600)(self.view)
+        w(self.request())
+        self.assertEqual(b'{"count": 1}', w(self.request()).content)
+
+    def test_max_variants(self):
+        w = widget(vary_on=['team'], min_interval=60, max_variants=1)(self.view)
+        w(self.request(team='a'))
+        w(self.request(team='b'))
+        self.assertEqual(1, len(w.geckoboard_decorator._last_payloads))
+        # The shared cache still serves the evicted variant.
+        key = decorators._cache_key(w.geckoboard_view_id, (), {'team': 'a'}, 'json', None)
+        self.assertNotEqual(None, cache.get(key + ':last'))
+        self.assertEqual(b'{"count": 1}', w(self.request(team='a')).content)
+
+    def test_max_variants_keeps_cached_responses(self):
+        w = widget(vary_on=['team'], cache_timeout=60, max_variants=1)(self.view)
+        w(self.request(team='a'))
+        w(self.request(team='b'))
+        self.assertEqual(b'{"count": 1}', w(self.request(team='a')).content)
+
+
 class NumberDecoratorTestCase(TestCase):
     """
     Tests for the ``number`` decorator.
@@ -210,6 +1052,23 @@ class NumberDecoratorTestCase(TestCase):
         json = '{"item": [{"value": 10}], "absolute": "true"}'
         self.assertJSONEqual(json, resp.content.decode('utf8'))
 
+    def test_array(self):
+        widget = number_widget(lambda r: array.array('d', [10, 9]))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [{"value": 10.0}, {"value": 9.0}]}',
+                             resp.content.decode('utf8'))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy(self):
+        widget = number_widget(lambda r: (numpy.int64(10), numpy.float32(9.5)))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [{"value": 10}, {"value": 9.5}]}',
+                             resp.content.decode('utf8'))
+        widget = number_widget(lambda r: numpy.array([10, 9]))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [{"value": 10}, {"value": 9}]}',
+                             resp.content.decode('utf8'))
+
     def test_single_value_as_dictionary(self):
         widget = number_widget(lambda r: [{'value': 10}])
         resp = widget(self.request)
@@ -358,6 +1217,32 @@ class PieChartDecoratorTestCase(TestCase):
              '{"value": 3, "label": "three", "colour": "8899aabb"}]}'),
             resp.content.decode('utf8'))
 
+    @unittest.skipIf(six.PY2, "memoryview does not support array.array on Python 2")
+    def test_memoryview(self):
+        widget = pie_chart(lambda r: memoryview(array.array('i', [1, 2, 3])))
+        resp = widget(self.request)
+        self.assertJSONEqual(
+            '{"item": [{"value": 1}, {"value": 2}, {"value": 3}]}',
+            resp.content.decode('utf8'))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy_structured(self):
+        data = numpy.array([(1, "one"), (2, "two")],
+                           dtype=[('value', 'i8'), ('label', 'U8')])
+        widget = pie_chart(lambda r: data)
+        resp = widget(self.request)
+        self.assertJSONEqual(
+            '{"item": [{"value": 1, "label": "one"}, {"value": 2, "label": "two"}]}',
+            resp.content.decode('utf8'))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy_scalars(self):
+        widget = pie_chart(lambda r: [(numpy.int64(1), 'a', 'ff0000'), numpy.float64(2.5)])
+        resp = widget(self.request)
+        self.assertJSONEqual(
+            '{"item": [{"value": 1, "label": "a", "colour": "ff0000"}, {"value": 2.5}]}',
+            resp.content.decode('utf8'))
+
 
 class LineChartDecoratorTestCase(TestCase):
     """
@@ -404,6 +1289,53 @@ class LineChartDecoratorTestCase(TestCase):
              '"colour": "00112233"}}'),
             resp.content.decode('utf8'))
 
+    def test_iterable_values(self):
+        widget = line_chart(lambda r: (iter([1, 2, 3]),))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [1, 2, 3], "settings": {}}', resp.content.decode('utf8'))
+
+    def test_array(self):
+        widget = line_chart(lambda r: (array.array('i', [1, 2, 3]),))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [1, 2, 3], "settings": {}}', resp.content.decode('utf8'))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy(self):
+        widget = line_chart(lambda r: (numpy.arange(3.0), numpy.array(["a", "b"])))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [0.0, 1.0, 2.0], "settings": {"axisx": ["a", "b"]}}',
+                             resp.content.decode('utf8'))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy_scalars(self):
+        widget = line_chart(lambda r: ([numpy.int64(1), 2], "x", [numpy.float64(0.5), 2]))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [1, 2], "settings": {"axisx": ["x"], "axisy": [0.5, 2]}}',
+                             resp.content.decode('utf8'))
+
+    def test_max_points(self):
+        values = [0] * 1000
+        values[500] = 100
+        widget = line_chart(max_points=100)(lambda r: (values, "x", "y"))
+        data = json.loads(widget(self.request).content.decode('utf8'))
+        self.assertEqual(100, len(data['item']))
+        self.assertEqual(100, max(data['item']))
+        self.assertEqual({"axisx": ["x"], "axisy": ["y"]}, data['settings'])
+
+    def test_max_points_minmax(self):
+        widget = line_chart(max_points=10, downsample='minmax')(lambda r: (range(100),))
+        data = json.loads(widget(self.request).content.decode('utf8'))
+        self.assertEqual([0, 19, 20, 39, 40, 59, 60, 79, 80, 99], data['item'])
+
+    def test_short_series(self):
+        widget = line_chart(max_points=10)(lambda r: ([1, 2, 3],))
+        resp = widget(self.request)
+        self.assertJSONEqual('{"item": [1, 2, 3], "settings": {}}', resp.content.decode('utf8'))
+
+    def test_invalid_downsample(self):
+        self.assertRaises(GeckoboardException, line_chart, max_points=10, downsample='x')
+        self.assertRaises(GeckoboardException, line_chart, max_points=2)
+
 
 class GeckOMeterDecoratorTestCase(TestCase):
     """
@@ -473,6 +1405,18 @@ class FunnelDecoratorTestCase(TestCase):
         }
         self.assertEqual(content, expected)
 
+    def test_funnel_options(self):
+        widget = funnel(type='reverse', percentage='hide')(
+            lambda r: {'items': [(50, 'step 2')], 'percentage': 'show'})
+        resp = widget(self.request)
+        content = json.loads(resp.content.decode('utf8'))
+        expected = {
+            'type': 'reverse',
+            'percentage': 'show',
+            'item': [{'value': 50, 'label': 'step 2'}],
+        }
+        self.assertEqual(content, expected)
+
     def test_funnel_sorting(self):
         sortable_data = self.funnel_data
         sortable_data.update({
@@ -555,3 +1499,12 @@ class BulletDecoratorTestCase(TestCase):
         self.assertEqual(item['range']['amber']['end'], .67)
         self.assertEqual(item['range']['green']['start'], .67)
         self.assertEqual(item['range']['green']['end'], 1.0)
+
+    def test_auto_scale_repeated(self):
+        bullet_data = self.bullet_data_minimal.copy()
+        bullet_data['auto_scale'] = True
+        widget = bullet(lambda r: bullet_data)
+        first = widget(self.request).content
+        self.assertEqual(first, widget(self.request).content)
+        self.assertEqual(600, bullet_data['comparative'])
+        self.assertFalse('sublabel' in bullet_data)
@@ -0,0 +1,58 @@
+"""
+Tests for the line chart downsampling functions.
+"""
+
+import math
+
+from django_geckoboard.downsampling import lttb, minmax
+from django_geckoboard.tests.utils import TestCase
+
+
+class LTTBTestCase(TestCase):
+    """
+    Tests for the ``lttb`` function.
+    """
+
+    def test_short(self):
+        values = [1, 2, 3]
+        self.assertTrue(lttb(values, 3) is values)
+
+    def test_length(self):
+        values = [math.sin(i / 10.0) for i in range(1000)]
+        for max_points in (3, 10, 99, 100, 999):
+            self.assertEqual(max_points, len(lttb(values, max_points)))
+
+    def test_endpoints(self):
+        values = list(range(100))
+        sampled = lttb(values, 10)
+        self.assertEqual(0, sampled[0])
+        self.assertEqual(99, sampled[-1])
+        self.assertEqual(sorted(sampled), sampled)
+
+    def test_spikes(self):
+        values = [0] * 1000
+        values[123] = 50
+        values[777] = -50
+        sampled = lttb(values, 20)
+        self.assertTrue(50 in sampled)
+        self.assertTrue(-50 in sampled)
+
+
+class MinMaxTestCase(TestCase):
+    """
+    Tests for the ``minmax`` function.
+    """
+
+    def test_short(self):
+        values = [1, 2, 3]
+        self.assertTrue(minmax(values, 3) is values)
+
+    def test_order(self):
+        self.assertEqual([5, 1, 3, 0], minmax([2, 5, 1, 3, 0, 3], 4))
+
+    def test_flat_bucket(self):
+        self.assertEqual([1, 2], minmax([1, 1, 2, 2], 2))
+
+    def test_length(self):
+        values = [math.sin(i / 10.0) for i in range(1000)]
+        self.assertTrue(len(minmax(values, 100)) <= 100)
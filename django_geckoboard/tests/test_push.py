@@ -0,0 +1,122 @@
+"""
+Tests for the Geckoboard push API client.
+"""
+
+import json
+import threading
+
+from six.moves import socketserver
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from django_geckoboard.decorators import line_chart, number_widget
+from django_geckoboard.push import PushClient, PushError
+from django_geckoboard.tests.utils import TestCase
+
+
+class PushHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, json.loads(body.decode('utf8'))))
+            server.clients.add(self.client_address)
+            status = server.statuses.pop(0) if server.statuses else 200
+        content = b'{"success": true}' if status == 200 else b'{"error": "failed"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class PushServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), PushHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.clients = set()
+        self.statuses = []
+
+
+class PushClientTestCase(TestCase):
+    """
+    Tests for ``PushClient``.
+    """
+
+    def setUp(self):
+        super(PushClientTestCase, self).setUp()
+        self.server = PushServer()
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.start()
+        url = 'http://127.0.0.1:%d/v1/send/' % self.server.server_address[1]
+        self.client = PushClient('key', url, max_connections=2, retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        super(PushClientTestCase, self).tearDown()
+
+    def test_push(self):
+        self.assertEqual({'success': True},
+                         self.client.push(number_widget(absolute='true'), 'w1', (10, 9)))
+        self.assertEqual([('/v1/send/w1', {
+            'api_key': 'key',
+            'data': {'item': [{'value': 10}, {'value': 9}], 'absolute': 'true'},
+        })], self.server.requests)
+
+    def test_push_decorator_class(self):
+        self.client.push(line_chart, 'w1', ([1, 2], 'x', 'y'))
+        self.assertEqual(
+            {'item': [1, 2], 'settings': {'axisx': ['x'], 'axisy': ['y']}},
+            self.server.requests[0][1]['data'])
+
+    def test_api_key_setting(self):
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        self.assertEqual('abc', PushClient().api_key)
+
+    def test_retry(self):
+        self.server.statuses = [500, 503]
+        self.assertEqual({'success': True}, self.client.push(number_widget, 'w1', 1))
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_retries_exhausted(self):
+        self.server.statuses = [500, 500, 500]
+        with self.assertRaises(PushError) as cm:
+            self.client.push(number_widget, 'w1', 1)
+        self.assertEqual(500, cm.exception.status)
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_client_error_not_retried(self):
+        self.server.statuses = [400]
+        with self.assertRaises(PushError) as cm:
+            self.client.push(number_widget, 'w1', 1)
+        self.assertEqual(400, cm.exception.status)
+        self.assertEqual(b'{"error": "failed"}', cm.exception.body)
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_connection_error(self):
+        client = PushClient('key', 'http://127.0.0.1:1/', retries=1, backoff=0.01)
+        with self.assertRaises(PushError) as cm:
+            client.push(number_widget, 'w1', 1)
+        self.assertEqual(None, cm.exception.status)
+
+    def test_push_many(self):
+        self.server.statuses = [400]
+        results = self.client.push_many(
+            (number_widget, 'w%d' % i, i) for i in range(20))
+        self.assertEqual(20, len(results))
+        self.assertEqual(1, len([r for r in results if isinstance(r, PushError)]))
+        self.assertEqual(19, results.count({'success': True}))
+        self.assertEqual(set('/v1/send/w%d' % i for i in range(20)),
+                         set(path for path, body in self.server.requests))
+        # Connections are reused.
+        self.assertTrue(len(self.server.clients) <= 2, self.server.clients)
@@ -0,0 +1,87 @@
+"""
+Tests for the time series store.
+"""
+
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpRequest
+
+from django_geckoboard import aggregates
+from django_geckoboard.decorators import GeckoboardException, line_chart
+from django_geckoboard.tests.utils import TestCase
+from django_geckoboard.timeseries import TimeSeries
+
+
+class TimeSeriesTestCase(TestCase):
+    """
+    Tests for ``TimeSeries``.
+    """
+
+    def setUp(self):
+        super(TimeSeriesTestCase, self).setUp()
+        self.settings_manager.set(USE_TZ=False)
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        cache.clear()
+        self.series = TimeSeries('orders')
+        self.now = datetime(2020, 1, 31, 12, 30, 15)
+
+    def test_empty(self):
+        self.assertEqual([0, 0, 0], self.series.values('day', 3, self.now))
+
+    def test_add(self):
+        self.series.add(when=self.now)
+        self.series.add(2, when=self.now + timedelta(seconds=30))
+        self.series.add(4, when=self.now - timedelta(minutes=1))
+        self.series.add(8, when=self.now - timedelta(hours=1))
+        self.series.add(16, when=self.now - timedelta(days=1))
+        self.assertEqual([4, 3], self.series.values('minute', 2, self.now))
+        self.assertEqual([8, 7], self.series.values('hour', 2, self.now))
+        self.assertEqual([16, 15], self.series.values('day', 2, self.now))
+
+    def test_retention(self):
+        series = TimeSeries('orders', retention={'minute': 10})
+        self.assertEqual(600, series._timeout('minute'))
+        self.assertEqual(72 * 3600, series._timeout('hour'))
+
+    def test_line_chart(self):
+        for days in range(7):
+            self.series.add(days, when=self.now - timedelta(days=days))
+        values, x_axis, y_axis = self.series.line_chart('day', 7, self.now)
+        self.assertEqual([6, 5, 4, 3, 2, 1, 0], values)
+        self.assertEqual(['25 Jan', '28 Jan', '31 Jan'], x_axis)
+        self.assertEqual([0, 6], y_axis)
+
+    def test_line_chart_widget(self):
+        self.series.add(3, when=self.now)
+        view = line_chart(format='json')(
+            lambda request: self.series.line_chart('hour', 2, self.now, x_labels=2,
+                                                   y_axis='Orders'))
+        self.assertJSONEqual(
+            '{"item": [0, 3], "settings": {"axisx": ["11:00", "12:00"], "axisy": ["Orders"]}}',
+            view(HttpRequest()).content.decode('utf8'))
+
+    def test_rebuild(self):
+        User = get_user_model()
+        for username, days in (('a', 0), ('b', 1), ('c', 1), ('d', 5)):
+            User.objects.create(username=username,
+                                date_joined=self.now - timedelta(days=days))
+        self.series.add(100, when=self.now)
+        self.series.rebuild(User.objects.all(), 'date_joined', buckets=3, when=self.now)
+        self.assertEqual([0, 2, 1], self.series.values('day', 3, self.now))
+        self.series.rebuild(User.objects.all(), 'date_joined', field='id', buckets=2,
+                            when=self.now)
+        ids = User.objects.order_by('username').values_list('id', flat=True)
+        self.assertEqual([ids[1] + ids[2], ids[0]], self.series.values('day', 2, self.now))
+
+    def test_rebuild_without_trunc(self):
+        trunc = aggregates.Trunc
+        aggregates.Trunc = None
+        try:
+            self.test_rebuild()
+        finally:
+            aggregates.Trunc = trunc
+
+    def test_unknown_resolution(self):
+        self.assertRaises(GeckoboardException, self.series.values, 'week')
@@ -0,0 +1,149 @@
+"""
+Tests for the Geckoboard views.
+"""
+
+import base64
+import json
+import threading
+import time
+
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+
+from django_geckoboard.decorators import number_widget, text_widget, widget
+from django_geckoboard.tests.utils import TestCase
+from django_geckoboard.views import dashboard
+
+
+@number_widget
+def user_count(request):
+    return (10, 9)
+
+
+@text_widget(format='xml')
+def message(request):
+    return "test"
+
+
+class DashboardTestCase(TestCase):
+    """
+    Tests for the ``dashboard`` view factory.
+    """
+
+    def setUp(self):
+        super(DashboardTestCase, self).setUp()
+        self.settings_manager.delete('GECKOBOARD_API_KEY')
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        super(DashboardTestCase, self).tearDown()
+
+    def render(self, view, request=None):
+        resp = view(request or HttpRequest())
+        self.assertEqual('application/json', resp['Content-Type'])
+        return json.loads(resp.content.decode('utf8'))
+
+    def test_dashboard(self):
+        view = dashboard([user_count, ('text', message)])
+        self.assertEqual({
+            'widgets': {
+                'user_count': {'item': [{'value': 10}, {'value': 9}]},
+                'text': '<?xml version="1.0" ?><root><item><text>test</text>'
+                        '<type>0</type></item></root>',
+            },
+            'errors': {},
+        }, self.render(view))
+
+    def test_json_requested(self):
+        request = HttpRequest()
+        request.GET['format'] = 'xml'
+        request.META['HTTP_ACCEPT_ENCODING'] = 'gzip'
+        view = dashboard([number_widget(compress=True, compress_min_size=0)(
+            lambda r: 10)])
+        self.assertEqual({'<lambda>': {'item': [{'value': 10}]}},
+                         self.render(view, request)['widgets'])
+
+    def test_encrypted(self):
+        view = dashboard([('secret', widget(encrypted=True)(lambda r: 'test'))])
+        content = self.render(view)['widgets']['secret']
+        self.assertTrue(base64.b64decode(content).startswith(b'Salted__'))
+
+    def test_errors(self):
+        def failing(request):
+            raise ValueError("failed")
+
+        def slow(request):
+            self.release.wait(5)
+            return 1
+
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        request = HttpRequest()
+        request.META['HTTP_AUTHORIZATION'] = b"basic " + base64.b64encode(b'abc')
+        view = dashboard([user_count,
+                          ('failing', widget(failing)),
+                          ('slow', widget(slow)),
+                          ('unavailable', lambda r: HttpResponse(status=503))],
+                         timeout=0.2)
+        content = self.render(view, request)
+        self.assertEqual(['user_count'], list(content['widgets']))
+        self.assertEqual({
+            'failing': 'ValueError: failed',
+            'slow': 'TimeoutError: timed out',
+            'unavailable': 'status 503',
+        }, content['errors'])
+
+    def test_timeout_for_all_views(self):
+        def slow(request):
+            self.release.wait(5)
+            return 1
+
+        views = [user_count] + [('slow%d' % i, widget(slow)) for i in range(3)]
+        start = time.time()
+        content = self.render(dashboard(views, timeout=0.3))
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEqual(['user_count'], list(content['widgets']))
+        self.assertEqual(['slow0', 'slow1', 'slow2'], sorted(content['errors']))
+
+    def test_running_view_not_called_again(self):
+        calls = []
+
+        def slow(request):
+            calls.append(None)
+            self.release.wait(5)
+            return 1
+
+        view = dashboard([('slow', widget(slow)), user_count], timeout=0.1)
+        self.render(view)
+        content = self.render(view)
+        self.assertEqual(['user_count'], list(content['widgets']))
+        self.assertEqual({'slow': 'TimeoutError: timed out'}, content['errors'])
+        self.assertEqual(1, len(calls))
+        # Once the call has finished, the view is called again.
+        self.release.set()
+        for i in range(100):
+            if 'slow' in self.render(view)['widgets']:
+                break
+            time.sleep(0.01)
+        else:
+            self.fail("the view was not called again")
+
+    def test_api_key(self):
+        self.settings_manager.set(GECKOBOARD_API_KEY=b'abc')
+        resp = dashboard([user_count])(HttpRequest())
+        self.assertTrue(isinstance(resp, HttpResponseForbidden), resp)
+
+    def test_concurrent(self):
+        barrier = []
+
+        def view(request):
+            barrier.append(None)
+            for i in range(100):
+                if len(barrier) == 3:
+                    return len(barrier)
+                self.release.wait(0.01)
+            raise RuntimeError("views did not run concurrently")
+
+        views = [('w%d' % i, widget(view)) for i in range(3)]
+        content = self.render(dashboard(views, timeout=5))
+        self.assertEqual({}, content['errors'])
+        self.assertEqual({'w0': 3, 'w1': 3, 'w2': 3}, content['widgets'])
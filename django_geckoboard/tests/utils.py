@@ -5,6 +5,7 @@ from __future__ import absolute_import
 
 from django.conf import settings
 from django.core.management import call_command
+from django.core.signals import setting_changed
 from django.test.testcases import TestCase as DjangoTestCase
 from django.test.utils import get_runner
 import django
@@ -40,7 +41,8 @@ class TestSettingsManager(object):
     From: http://www.djangosnippets.org/snippets/1011/
 
     A class which can modify some Django settings temporarily for a
-    test and then revert them to their original values later.
+    test and then revert them to their original values later.  The
+    ``setting_changed`` signal is sent for every change.
 
     Automatically handles resyncing the DB if INSTALLED_APPS is
     modified.
@@ -56,6 +58,7 @@ class TestSettingsManager(object):
             self._original_settings.setdefault(k, getattr(settings, k,
                                                           self.NO_SETTING))
             setattr(settings, k, v)
+            self._changed(k, v, True)
         if 'INSTALLED_APPS' in kwargs:
             self.syncdb()
 
@@ -67,6 +70,12 @@ class TestSettingsManager(object):
                 delattr(settings, k)
             except AttributeError:
                 pass  # setting did not exist
+            else:
+                self._changed(k, None, True)
+
+    def _changed(self, setting, value, enter):
+        setting_changed.send(sender=settings._wrapped.__class__, setting=setting,
+                             value=value, enter=enter)
 
     def syncdb(self):
         call_command('syncdb', verbosity=0, interactive=False)
@@ -76,8 +85,10 @@ class TestSettingsManager(object):
             if v == self.NO_SETTING:
                 if hasattr(settings, k):
                     delattr(settings, k)
+                self._changed(k, None, False)
             else:
                 setattr(settings, k, v)
+                self._changed(k, v, False)
         if 'INSTALLED_APPS' in self._original_settings:
             self.syncdb()
         self._original_settings = {}
@@ -0,0 +1,160 @@
+"""
+Incrementally maintained time series for line chart widgets.
+
+A time series stores the sum of the values added in each minute, hour
+and day in the cache, so that a line chart view can read the buckets
+it shows instead of aggregating the full history on every poll.
+"""
+from __future__ import absolute_import
+
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from django_geckoboard.aggregates import _period_values
+from django_geckoboard.decorators import GeckoboardException
+
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+_STEPS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+_KEY_FORMATS = {
+    'minute': '%Y%m%d%H%M',
+    'hour': '%Y%m%d%H',
+    'day': '%Y%m%d',
+}
+
+_LABEL_FORMATS = {
+    'minute': '%H:%M',
+    'hour': '%H:00',
+    'day': '%d %b',
+}
+
+#: The default number of buckets kept for each resolution.
+RETENTION = {
+    'minute': 120,
+    'hour': 72,
+    'day': 90,
+}
+
+
+class TimeSeries(object):
+    """
+    A time series of integer values, stored in the cache named by
+    `cache_alias` as sums per minute, hour and day.
+
+    Values are added to a bucket of each resolution with atomic cache
+    increments.  Buckets expire after the number of periods given for
+    their resolution in `retention` (see ``RETENTION`` for the
+    defaults), so that old data is only kept at coarser resolutions.
+    Missing buckets read as 0.
+    """
+
+    def __init__(self, name, cache_alias='default', retention=None):
+        self.name = name
+        self.cache_alias = cache_alias
+        self.retention = dict(RETENTION)
+        if retention is not None:
+            self.retention.update(retention)
+
+    def add(self, value=1, when=None):
+        """
+        Add `value` to the buckets that contain `when` (by default the
+        current time).
+        """
+        cache = caches[self.cache_alias]
+        for resolution in RESOLUTIONS:
+            key = self._key(resolution, self._bucket_start(resolution, when))
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                # The bucket does not exist yet; another process may
+                # create it concurrently.
+                if not cache.add(key, value, self._timeout(resolution)):
+                    cache.incr(key, value)
+
+    def values(self, resolution='day', buckets=30, when=None):
+        """
+        Return the values of the last `buckets` buckets of `resolution`,
+        up to and including the bucket that contains `when`.
+        """
+        return self._values(resolution, self._bucket_starts(resolution, buckets, when))
+
+    def line_chart(self, resolution='day', buckets=30, when=None, x_labels=3, y_axis=None):
+        """
+        Return a `(values, x_axis, y_axis)` tuple for ``line_chart``.
+
+        The X-axis has `x_labels` labels with the times of evenly spaced
+        buckets.  The Y-axis labels default to the lowest and highest
+        values.
+        """
+        starts = self._bucket_starts(resolution, buckets, when)
+        values = self._values(resolution, starts)
+        label_format = _LABEL_FORMATS[resolution]
+        if x_labels > 1 and buckets > 1:
+            indexes = [i * (buckets - 1) // (x_labels - 1) for i in range(x_labels)]
+        else:
+            indexes = [buckets - 1]
+        x_axis = [starts[i].strftime(label_format) for i in indexes]
+        if y_axis is None:
+            y_axis = [min(values), max(values)]
+        return values, x_axis, y_axis
+
+    def rebuild(self, queryset, date_field, field=None, resolution='day', buckets=None,
+                when=None):
+        """
+        Recompute the buckets of `resolution` from the database, in a
+        single query.  The values are the number of rows in `queryset`
+        per bucket of `date_field`, or the sum of `field` if it is
+        given.  By default all retained buckets are recomputed.
+        """
+        if buckets is None:
+            buckets = self.retention[resolution]
+        starts = self._bucket_starts(resolution, buckets, when)
+        end = self._bucket_start(resolution, starts[-1] + _STEPS[resolution])
+        queryset = queryset.filter(**{date_field + '__gte': starts[0], date_field + '__lt': end})
+        values = dict((self._key(resolution, start), 0) for start in starts)
+        for when, value in _period_values(queryset, date_field, resolution, field):
+            key = self._key(resolution, self._bucket_start(resolution, when))
+            if key in values:
+                values[key] += value or 0
+        caches[self.cache_alias].set_many(values, self._timeout(resolution))
+
+    def _values(self, resolution, starts):
+        keys = [self._key(resolution, start) for start in starts]
+        cached = caches[self.cache_alias].get_many(keys)
+        return [cached.get(key, 0) for key in keys]
+
+    def _timeout(self, resolution):
+        return int(self.retention[resolution] * _STEPS[resolution].total_seconds())
+
+    def _key(self, resolution, start):
+        return 'geckoboard:timeseries:%s:%s:%s' % (self.name, resolution,
+                                                   start.strftime(_KEY_FORMATS[resolution]))
+
+    def _bucket_starts(self, resolution, buckets, when):
+        end = self._bucket_start(resolution, when)
+        step = _STEPS[resolution]
+        return [self._bucket_start(resolution, end - step * i)
+                for i in range(buckets - 1, -1, -1)]
+
+    def _bucket_start(self, resolution, when):
+        if resolution not in _STEPS:
+            raise GeckoboardException("unknown resolution: %s" % resolution)
+        if when is None:
+            when = timezone.now()
+        if timezone.is_aware(when):
+            when = timezone.localtime(when)
+        when = when.replace(second=0, microsecond=0)
+        if resolution == 'minute':
+            return when
+        when = when.replace(minute=0)
+        if resolution == 'hour':
+            return when
+        return when.replace(hour=0)
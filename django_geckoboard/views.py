@@ -0,0 +1,138 @@
+"""
+Geckoboard views.
+"""
+from __future__ import absolute_import
+
+import copy
+import json
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+
+from django_geckoboard.decorators import (
+    _is_api_key_correct, iscoroutinefunction,
+)
+
+
+def dashboard(views, timeout=10, max_workers=None):
+    """
+    Return a view that renders a number of widget views at once.
+
+    The `views` argument is a list of views decorated with the widget
+    decorators, or a list of `(name, view)` tuples.  The name of a view
+    defaults to its function name.  The views are called concurrently
+    on a thread pool of `max_workers` threads (by default one per view).
+    If one of the views is asynchronous, the returned view is
+    asynchronous too and runs the asynchronous views as tasks.
+
+    The response is a JSON object with a ``widgets`` member that maps
+    the view names to their JSON output (other output is included as a
+    string), and an ``errors`` member that maps the names of views that
+    failed, did not return a 200 response or did not finish within
+    `timeout` seconds to an error message.  The timeout applies to all
+    views together, so the response takes at most `timeout` seconds.
+
+    Views that time out keep running in the background, and hold a
+    worker thread until they finish.  A view is never called again
+    while an earlier call is still running; later requests wait for
+    that call instead.  With the default `max_workers`, a stuck view
+    therefore cannot delay the other views.
+    """
+    views = [view if isinstance(view, tuple) else (view.__name__, view)
+             for view in views]
+    if max_workers is None:
+        max_workers = len(views)
+    runner = _ViewRunner(max_workers)
+    if any(iscoroutinefunction(view) for name, view in views):
+        from django_geckoboard.async_views import async_dashboard
+        return async_dashboard(views, timeout, runner)
+
+    @csrf_exempt
+    def dashboard_view(request):
+        if not _is_api_key_correct(request):
+            return HttpResponseForbidden("Geckoboard API key incorrect")
+        widget_request = _widget_request(request)
+        futures = [runner.submit(view, widget_request) for name, view in views]
+        wait(futures, timeout)
+        results = []
+        for (name, view), future in zip(views, futures):
+            if not future.done():
+                results.append((name, view, TimeoutError("timed out")))
+                continue
+            try:
+                results.append((name, view, future.result()))
+            except Exception as e:
+                results.append((name, view, e))
+        return _render_dashboard(results)
+    return dashboard_view
+
+
+class _ViewRunner(object):
+    """
+    Calls the synchronous views of a dashboard on a thread pool, at most
+    one call of each view at a time.
+    """
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def submit(self, view, request):
+        """
+        Return a future for a call of `view`.  If an earlier call is
+        still running, its future is returned instead.
+        """
+        with self._lock:
+            future = self._running.get(view)
+            if future is None or future.done():
+                future = self._running[view] = self._executor.submit(_call_view, view, request)
+            return future
+
+
+def _call_view(view, request):
+    try:
+        return view(request)
+    finally:
+        close_old_connections()
+
+
+def _widget_request(request):
+    """
+    Return a copy of the request for the widget views, which asks for
+    uncompressed JSON output.
+    """
+    widget_request = copy.copy(request)
+    widget_request.GET = request.GET.copy()
+    widget_request.GET['format'] = 'json'
+    widget_request.META = request.META.copy()
+    widget_request.META.pop('HTTP_ACCEPT_ENCODING', None)
+    widget_request.META.pop('HTTP_IF_NONE_MATCH', None)
+    return widget_request
+
+
+def _render_dashboard(results):
+    """
+    Render the dashboard response from a list of `(name, view, response
+    or exception)` tuples.  JSON output is included without decoding.
+    """
+    widgets = []
+    errors = {}
+    for name, view, result in results:
+        if isinstance(result, BaseException):
+            errors[name] = "%s: %s" % (type(result).__name__, result)
+        elif result.status_code != 200:
+            errors[name] = "status %d" % result.status_code
+        else:
+            content = result.content
+            decorator = getattr(view, 'geckoboard_decorator', None)
+            is_json = result['Content-Type'].startswith('application/json')
+            if not is_json or decorator is None or decorator._encrypted:
+                content = json.dumps(content.decode('utf8')).encode('utf8')
+            widgets.append(json.dumps(name).encode('utf8') + b': ' + content)
+    content = b''.join((b'{"widgets": {', b', '.join(widgets), b'}, "errors": ',
+                        json.dumps(errors, sort_keys=True).encode('utf8'), b'}'))
+    return HttpResponse(content, content_type='application/json')
@@ -52,9 +52,14 @@ setup(
     author_email=django_geckoboard.__email__,
     packages=[
         'django_geckoboard',
+        'django_geckoboard.benchmarks',
+        'django_geckoboard.management',
+        'django_geckoboard.management.commands',
         'django_geckoboard.tests',
     ],
-    install_requires=['six', 'django', 'pycrypto'],
+    install_requires=[
+        'six', 'django', 'pycrypto', 'futures; python_version < "3"',
+    ],
     keywords=['django', 'geckoboard'],
     classifiers=[
         'Development Status :: 4 - Beta',